@@ -0,0 +1,69 @@
+from time import perf_counter
+
+import numpy as np
+
+
+class AnytimeTrace:
+    # Convergence profile of one run: (elapsed time, FM calls, best cutstate)
+    # stored only when the best cutstate improves, in preallocated arrays
+    __slots__ = ('times', 'fm_calls', 'cutstates', 'size', 'calls', 'best', 'started')
+
+    def __init__(self, capacity=1024):
+        self.times = np.empty(capacity, dtype=np.float64)
+        self.fm_calls = np.empty(capacity, dtype=np.int64)
+        self.cutstates = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+        self.calls = 0
+        self.best = None
+        self.started = perf_counter()
+
+    def start(self):
+        self.size = 0
+        self.calls = 0
+        self.best = None
+        self.started = perf_counter()
+
+    def record(self, cutstate, calls=1):
+        # Called after every FM call (or after `calls` of them at once)
+        self.calls += calls
+        if self.best is not None and cutstate >= self.best:
+            return
+        self.best = cutstate
+        if self.size == len(self.times):
+            self.grow()
+        self.times[self.size] = perf_counter() - self.started
+        self.fm_calls[self.size] = self.calls
+        self.cutstates[self.size] = cutstate
+        self.size += 1
+
+    def grow(self):
+        capacity = 2 * len(self.times)
+        for name in ('times', 'fm_calls', 'cutstates'):
+            array = np.empty(capacity, dtype=getattr(self, name).dtype)
+            array[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, array)
+
+    def time_to_target(self, target):
+        # Elapsed time when the best cutstate first reached target, or None
+        reached = np.flatnonzero(self.cutstates[:self.size] <= target)
+        return float(self.times[reached[0]]) if len(reached) else None
+
+    def to_arrays(self):
+        return self.times[:self.size], self.fm_calls[:self.size], self.cutstates[:self.size]
+
+
+def save_traces(traces, filename):
+    # All runs in one compressed file, `run` tells which run a row belongs to
+    columns = [trace.to_arrays() for trace in traces]
+    np.savez_compressed(
+        filename,
+        run=np.repeat(np.arange(len(traces), dtype=np.int32), [trace.size for trace in traces]),
+        time=np.concatenate([np.zeros(0)] + [column[0] for column in columns]),
+        fm_calls=np.concatenate([np.zeros(0, dtype=np.int64)] + [column[1] for column in columns]),
+        cutstate=np.concatenate([np.zeros(0, dtype=np.int64)] + [column[2] for column in columns]),
+        total_fm_calls=np.array([trace.calls for trace in traces], dtype=np.int64))
+
+
+def load_traces(filename):
+    with np.load(filename) as data:
+        return {key: data[key] for key in data.files}
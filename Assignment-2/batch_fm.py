@@ -0,0 +1,182 @@
+from os.path import join
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from loader import load_graph
+from partition import Partition
+
+
+def neighbour_entries(csr, nodes):
+    # (row, neighbour) pairs of the neighbours of nodes[row] for every row
+    counts = csr.degrees[nodes]
+    rows = np.repeat(np.arange(len(nodes)), counts)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, csr.indices[np.repeat(csr.indptr[nodes], counts) + offsets]
+
+
+def node_gains(sides, ones, degrees):
+    # Gain of moving every node to the other block, from its block 1
+    # neighbour count
+    return np.where(sides == 1, degrees - 2 * ones, 2 * ones - degrees).astype(np.int32)
+
+
+def improving_pair(csr, side, gain):
+    # Exact search of one row for a swap that lowers the cutstate, as
+    # (u, v, gain) with u in block 1, or None. Only needed when the best
+    # gains of the two blocks add up to 1 or 2, where every improving pair
+    # is made of non neighbours close to the top of both blocks.
+    in_one = side == 1
+    best_one = gain[in_one].max(initial=-csr.max_degree - 1)
+    best_zero = gain[~in_one].max(initial=-csr.max_degree - 1)
+    if best_one + best_zero <= 0:
+        return None
+    for u in np.flatnonzero(in_one & (gain >= 1 - best_zero)).tolist():
+        partners = np.flatnonzero(~in_one & (gain >= 1 - gain[u]))
+        partners = partners[~np.isin(partners, csr.neighbours(u))]
+        if len(partners):
+            v = int(partners[np.argmax(gain[partners])])
+            return u, v, int(gain[u] + gain[v])
+    return None
+
+
+def batch_local_search(csr, partitions, seed=0, max_rounds=None, candidates=None):
+    # Swap local search on many partitions at once, one partition per row of
+    # a P x n matrix. ones[p, v] counts the neighbours of v in block 1 of
+    # partition p and comes from one sparse product, the gains follow from
+    # it. Both are kept up to date for the moved nodes and their neighbours
+    # only.
+    # Every round each row pairs the i-th best of its top candidates in
+    # block 1 with the i-th best in block 0 and swaps every pair that lowers
+    # the cutstate, except pairs next to a better ranked pair, so the swaps
+    # of a round do not change each other's gains. A row is only retired
+    # once improving_pair finds no swap that lowers its cutstate, so every
+    # row ends in a swap local optimum with its starting block sizes. Ties
+    # are broken by fixed random priorities.
+    # Returns the final partitions and their cutstates.
+    rng = np.random.default_rng(seed)
+    sides = np.array(partitions, dtype=np.int8, ndmin=2)
+    count, size = sides.shape
+    matrix = csr.matrix()
+    degrees = csr.degrees
+    ones = np.ascontiguousarray((matrix @ sides.T.astype(np.int32)).T)
+    gains = node_gains(sides, ones, degrees)
+    cutstates = np.where(sides == 1, degrees - ones, 0).sum(axis=1)
+    priority = (0.5 * rng.random(sides.shape)).astype(np.float32)
+    candidates = candidates or max(1, size // 32)
+    # Rank of the pair of every node swapped this round, size elsewhere
+    ranks = np.full(sides.shape, size, dtype=np.int32)
+
+    block_ones = sides.sum(axis=1)
+    active = np.flatnonzero((block_ones > 0) & (block_ones < size))
+    rounds = 0
+    while len(active) and (max_rounds is None or rounds < max_rounds):
+        side = sides[active] == 1
+        keys = gains[active] + priority[active]
+        top = min(candidates, size - 1)
+        pairs = []
+        for block in (side, ~side):
+            block_keys = np.where(block, keys, -np.inf)
+            nodes = np.argpartition(-block_keys, top - 1, axis=1)[:, :top]
+            order = np.argsort(-np.take_along_axis(block_keys, nodes, axis=1), axis=1)
+            nodes = np.take_along_axis(nodes, order, axis=1)
+            pairs.append((nodes, np.isfinite(np.take_along_axis(block_keys, nodes, axis=1))))
+        (u, u_valid), (v, v_valid) = pairs
+        rows = np.repeat(active, top).reshape(u.shape)
+        adjacent = np.asarray(matrix[u.ravel(), v.ravel()]).reshape(u.shape)
+        pair_gains = gains[rows, u] + gains[rows, v] - 2 * adjacent
+        chosen = u_valid & v_valid & (pair_gains > 0)
+
+        # Drop the pairs with a node next to a node of a better ranked pair
+        row, rank = np.nonzero(chosen)
+        nodes = np.concatenate([u[row, rank], v[row, rank]])
+        node_rows = np.concatenate([active[row], active[row]])
+        node_ranks = np.concatenate([rank, rank])
+        ranks[node_rows, nodes] = node_ranks
+        entries, neighbours = neighbour_entries(csr, nodes)
+        conflicted = ranks[node_rows[entries], neighbours] < node_ranks[entries]
+        ranks[node_rows, nodes] = size
+        clash = np.zeros(len(nodes), dtype=bool)
+        clash[entries[conflicted]] = True
+        clash = clash[:len(row)] | clash[len(row):]
+        row, rank = row[~clash], rank[~clash]
+        moved_rows = active[row]
+        moved_u, moved_v = u[row, rank], v[row, rank]
+        np.subtract.at(cutstates, moved_rows, pair_gains[row, rank])
+
+        # Rows without a swap are searched exactly before they retire
+        idle = np.ones(len(active), dtype=bool)
+        idle[row] = False
+        retired = []
+        extra = []
+        for p in active[idle].tolist():
+            pair = improving_pair(csr, sides[p], gains[p])
+            if pair is None:
+                retired.append(p)
+            else:
+                extra.append((p,) + pair)
+        if extra:
+            extra_rows, extra_u, extra_v, extra_gains = (np.array(x) for x in zip(*extra))
+            cutstates[extra_rows] -= extra_gains
+            moved_rows = np.concatenate([moved_rows, extra_rows])
+            moved_u = np.concatenate([moved_u, extra_u])
+            moved_v = np.concatenate([moved_v, extra_v])
+
+        # Swap, then update the counts and gains of the moved nodes and
+        # their neighbours
+        sides[moved_rows, moved_u] = 0
+        sides[moved_rows, moved_v] = 1
+        flat_ones = ones.reshape(-1)
+        touched = [moved_rows * size + moved_u, moved_rows * size + moved_v]
+        for nodes, change in ((moved_u, -1), (moved_v, 1)):
+            entries, neighbours = neighbour_entries(csr, nodes)
+            flat = moved_rows[entries] * size + neighbours
+            np.add.at(flat_ones, flat, change)
+            touched.append(flat)
+        touched = np.concatenate(touched)
+        columns = touched % size
+        gains.reshape(-1)[touched] = np.where(
+            sides.reshape(-1)[touched] == 1, degrees[columns] - 2 * flat_ones[touched],
+            2 * flat_ones[touched] - degrees[columns])
+
+        if retired:
+            active = np.setdiff1d(active, retired, assume_unique=True)
+        rounds += 1
+    return sides, cutstates
+
+
+def batch_multi_start(csr, restarts=2500, batch_size=500, seed=0):
+    # MLS with batch_local_search: restarts random balanced partitions in
+    # batches of batch_size rows. Returns the best result like
+    # fiduccia_mattheyses, with the number of restarts of the best one.
+    np.random.seed(seed)
+    best = None
+    for first in range(0, restarts, batch_size):
+        count = min(batch_size, restarts - first)
+        starts = np.stack([Partition.random(csr.size) for _ in range(count)])
+        sides, cutstates = batch_local_search(csr, starts, seed=[seed, first])
+        row = int(np.argmin(cutstates))
+        if best is None or cutstates[row] < best['cutstate']:
+            best = {'solution': Partition(sides[row]), 'cutstate': int(cutstates[row]),
+                    'restart': first + row}
+    return best
+
+
+if __name__ == '__main__':
+
+    csr = load_graph('Graph500.txt')
+    data_storage = join('data', 'mls')
+    performance_stats = []
+    solutions = []
+    for j in range(25):
+        tic = perf_counter()
+        result = batch_multi_start(csr, restarts=2500, seed=j)
+        toc = perf_counter()
+        solution = result['solution'].to_solution(csr)
+        solution['cutstate'] = result['cutstate']
+        print(solution['cutstate'])
+        solutions.append(solution)
+        performance_stats.append({'Execution Time': toc - tic})
+    pd.DataFrame(solutions).to_csv(join(data_storage, f'mls_with_batch_fm.csv'))
+    pd.DataFrame(performance_stats).to_csv(join(data_storage, f'mls_with_batch_fm_performance.csv'))
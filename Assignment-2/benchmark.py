@@ -0,0 +1,285 @@
+import argparse
+import copy
+import json
+import platform
+import random
+import statistics
+import sys
+from os import makedirs
+from os.path import dirname, exists, join
+from time import process_time
+
+import numpy as np
+
+from budget import Budget
+from ea import GLS
+from generator import random_geometric_graph
+from graph_correct import Graph
+from loader import load_graph
+from perturbation import mutation
+from population import Population
+
+BASELINE = join('data', 'benchmarks', 'baseline.json')
+
+# Whether a larger value of the metric is better
+HIGHER_IS_BETTER = {
+    'gain_init_seconds': False,
+    'moves_per_second': True,
+    'passes_per_second': True,
+    'mls_restart_seconds': False,
+    'ils_step_seconds': False,
+    'gls_child_seconds': False,
+    'time_to_target_seconds': False,
+}
+
+
+def fresh_graph(csr):
+    graph = Graph(csr=csr)
+    graph.init_partition()
+    graph.setup_gains()
+    return graph
+
+
+def run_fm(graph, solution=None, budget=None, cutoff=None):
+    graph.reset_solutions()
+    if solution is None:
+        graph.init_partition()
+    else:
+        graph.init_partition(solution)
+    graph.setup_gains()
+    return graph.fiduccia_mattheyses(budget, cutoff)
+
+
+def best_time(function, repeat, min_seconds=0.1, seed=0):
+    # Lowest CPU time per call over repeat samples. Steps of a few
+    # milliseconds are not timed one at a time: a warm up run finds how many
+    # calls take min_seconds and every sample makes that many calls from the
+    # same seeds, so the samples do the same work. CPU time leaves out the
+    # time the process waits for the processor. function may return the part
+    # of its time to count, otherwise the whole call counts.
+    number = 0
+    started = process_time()
+    while number == 0 or process_time() - started < min_seconds:
+        function()
+        number += 1
+    samples = []
+    for _ in range(repeat):
+        reseed(seed)
+        total = 0.0
+        for _ in range(number):
+            tic = process_time()
+            spent = function()
+            total += process_time() - tic if spent is None else spent
+        samples.append(total / number)
+    return min(samples)
+
+
+def bench_gain_init(csr, repeat):
+    graph = Graph(csr=csr)
+
+    def step():
+        graph.init_partition()
+        tic = process_time()
+        graph.setup_gains()
+        return process_time() - tic
+    return best_time(step, repeat)
+
+
+def bench_moves(csr, repeat, swaps=200):
+    # Each block gives one free node per swap
+    swaps = min(swaps, csr.size // 2)
+
+    def step():
+        graph = fresh_graph(csr)
+        graph.start_pass()
+        tic = process_time()
+        for _ in range(swaps):
+            graph.swap()
+        return process_time() - tic
+    return 2 * swaps / best_time(step, repeat)
+
+
+def bench_passes(csr, repeat):
+    def step():
+        graph = fresh_graph(csr)
+        tic = process_time()
+        graph.fm_pass()
+        return process_time() - tic
+    return 1 / best_time(step, repeat)
+
+
+def bench_mls_restart(csr, repeat):
+    graph = Graph(csr=csr)
+    cutstates = []
+
+    def step():
+        cutstates.append(run_fm(graph)['cutstate'])
+    return best_time(step, repeat), cutstates
+
+
+def bench_ils_step(csr, repeat, rate=0.01):
+    graph = Graph(csr=csr)
+    run_fm(graph)
+    optimum = graph.get_partition()
+
+    def step():
+        graph.reset_solutions()
+        graph.reinit_partition(mutation(optimum, rate))
+        graph.fiduccia_mattheyses()
+    return best_time(step, repeat)
+
+
+def bench_gls_child(csr, repeat, population_size=10):
+    graph = Graph(csr=csr)
+    gls = GLS(population_size=2, length=csr.size)
+    population = Population(population_size, csr.size)
+    for _ in range(population_size):
+        result = run_fm(graph)
+        population.add(result['solution'], result['cutstate'])
+
+    def step():
+        # Every child is made from the same population, outside the timing
+        gls.population = copy.deepcopy(population)
+        tic = process_time()
+        child = gls.crossover(length=csr.size)
+        result = run_fm(graph, child)
+        gls.create_new_population(result['solution'], result['cutstate'])
+        return process_time() - tic
+    return best_time(step, repeat)
+
+
+def mls_until(graph, target, limit, seed):
+    # CPU time of an MLS run from seed until a restart reaches target, None
+    # if it does not within limit seconds
+    random.seed(seed)
+    tic = process_time()
+    budget = Budget(wall_time=limit)
+    while not budget.exhausted():
+        if run_fm(graph, budget=budget)['cutstate'] <= target:
+            return process_time() - tic
+    return None
+
+
+def bench_time_to_target(csr, target, runs, limit, repeat=1):
+    # Median CPU time of independent MLS runs until a restart reaches
+    # target, and the number of runs that did not reach it within limit. The
+    # time is None unless every run reached the target. Run i always starts
+    # from seed i and does the same restarts, so it is repeated and its
+    # lowest time counts.
+    graph = Graph(csr=csr)
+    times = []
+    failures = 0
+    for run in range(runs):
+        time = mls_until(graph, target, limit, run)
+        if time is None:
+            failures += 1
+            continue
+        times.append(min([time] + [mls_until(graph, target, limit, run) for _ in range(repeat - 1)]))
+    return (statistics.median(times) if not failures else None), failures
+
+
+def bench_cutoffs(csr, cutoffs, runs):
+    # FM time and cutstate for pass cutoffs, every cutoff on the same starts
+    graph = Graph(csr=csr)
+    results = {}
+    for cutoff in cutoffs:
+        times = []
+        cutstates = []
+        for run in range(runs):
+            random.seed(run)
+            tic = process_time()
+            cutstates.append(run_fm(graph, cutoff=cutoff)['cutstate'])
+            times.append(process_time() - tic)
+        results[f'cutoff_{cutoff or "none"}_seconds'] = statistics.median(times)
+        results[f'cutoff_{cutoff or "none"}_cutstate'] = statistics.mean(cutstates)
+    return results
+
+
+def reseed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def run_benchmarks(name, csr, repeat, target=None, runs=5, limit=60, seed=0, cutoffs=()):
+    # Every benchmark starts from seed, so its setup does not depend on how
+    # many calls the ones before it made
+    results = {'nodes': csr.size, 'edges': len(csr.indices) // 2}
+    reseed(seed)
+    results['gain_init_seconds'] = bench_gain_init(csr, repeat)
+    reseed(seed)
+    results['moves_per_second'] = bench_moves(csr, repeat)
+    reseed(seed)
+    results['passes_per_second'] = bench_passes(csr, repeat)
+    reseed(seed)
+    results['mls_restart_seconds'], cutstates = bench_mls_restart(csr, repeat)
+    reseed(seed)
+    results['ils_step_seconds'] = bench_ils_step(csr, repeat)
+    reseed(seed)
+    results['gls_child_seconds'] = bench_gls_child(csr, repeat)
+    # Without a target the median restart cutstate of this run becomes one
+    results['target_cutstate'] = target if target is not None else int(statistics.median(cutstates))
+    results['time_to_target_seconds'], results['time_to_target_failures'] = \
+        bench_time_to_target(csr, results['target_cutstate'], runs, limit, repeat)
+    if cutoffs:
+        results.update(bench_cutoffs(csr, cutoffs, max(repeat, 10)))
+    print(f'{name}: ' + ', '.join(f'{key} {value:.4g}' if value is not None else f'{key} failed'
+                                  for key, value in results.items()))
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Metrics that got worse than the baseline by more than threshold
+    slowdowns = []
+    for name, metrics in results.items():
+        for metric, higher in HIGHER_IS_BETTER.items():
+            if name not in baseline or metric not in baseline[name]:
+                continue
+            old, new = baseline[name][metric], metrics[metric]
+            if new is None and old is not None:
+                slowdowns.append(f'{name} {metric}: {old:.4g} -> failed')
+                continue
+            # No relative change from a zero or failed measurement
+            if not old or new is None:
+                continue
+            change = (old - new) / old if higher else (new - old) / old
+            if change > threshold:
+                slowdowns.append(f'{name} {metric}: {old:.4g} -> {new:.4g} ({change:+.0%})')
+    return slowdowns
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='FM and local search benchmarks')
+    parser.add_argument('--graphs', nargs='*', default=['Graph500.txt'])
+    parser.add_argument('--generate', nargs='*', type=int, default=[5000],
+                        help='sizes of random geometric graphs to add')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--cutoffs', nargs='*', type=int, default=[],
+                        help='FM pass cutoffs to compare with full passes')
+    arguments = parser.parse_args()
+
+    baseline = {}
+    if exists(arguments.baseline):
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)['results']
+
+    instances = [(filename, load_graph(filename)) for filename in arguments.graphs]
+    instances += [(f'rgg_{size}', random_geometric_graph(size, seed=size)) for size in arguments.generate]
+    results = {}
+    for name, csr in instances:
+        target = baseline.get(name, {}).get('target_cutstate')
+        results[name] = run_benchmarks(name, csr, arguments.repeat, target,
+                                       cutoffs=[None] + arguments.cutoffs if arguments.cutoffs else ())
+
+    slowdowns = compare(results, baseline, arguments.threshold)
+    for slowdown in slowdowns:
+        print(f'SLOWER {slowdown}')
+
+    if arguments.save_baseline or not baseline:
+        makedirs(dirname(arguments.baseline), exist_ok=True)
+        with open(arguments.baseline, 'w') as f:
+            json.dump({'python': platform.python_version(), 'results': results}, f, indent=2)
+    sys.exit(1 if slowdowns else 0)
@@ -1,59 +1,129 @@
+from random import randint
+
+import numpy as np
+
+
 class Block:
-    def __init__(self, nodes=[], freedoms={}, max_degree=0):
-        self.nodes = nodes
-        self.freedoms = freedoms
+    def __init__(self, side, state, max_degree=0):
+        # The block owns the nodes whose state.side equals side
+        self.side = side
+        self.state = state
         self.max_degree = max_degree
-        self.gains_storage = {i: set()
-                              for i in range(-max_degree, max_degree + 1)}
-        self.highest_gain = 0
+        self.size = 0
+        self.free_count = 0
 
-    @property
-    def size(self):
-        return len(self.nodes)
+        # Bucket i holds the free nodes with gain i - max_degree
+        self.gains_storage = [[] for _ in range(2 * max_degree + 1)]
+        # Upper bound of the highest non empty bucket, only lowered lazily
+        self.highest_gain = -max_degree - 1
 
     def add_node(self, node, freedom):
-        self.nodes.append(node)
-        self.freedoms[node] = freedom
+        self.state.side[node] = self.side
+        self.state.locked[node] = not freedom
+        self.size += 1
+        if freedom:
+            self.free_count += 1
+
+    def add_free_nodes(self, count):
+        # Nodes whose state.side the caller already set to this block
+        self.size += count
+        self.free_count += count
+
+    def clear(self):
+        # Empty block, keeping the bucket lists
+        for bucket in self.gains_storage:
+            bucket.clear()
+        self.highest_gain = -self.max_degree - 1
+        self.size = 0
+        self.free_count = 0
+
+    def fill(self, nodes):
+        # Empties the block and adds nodes, a sorted array of node ids whose
+        # state.side and state.gain are already set, free and bucketed at
+        # once. Buckets keep the nodes in id order, as save_node_at_gain
+        # calls in id order would.
+        state = self.state
+        gains = np.frombuffer(state.gain, dtype=np.int32)[nodes]
+        order = np.argsort(gains, kind='stable')
+        nodes = nodes[order]
+        gains = gains[order]
+        starts = np.searchsorted(gains, np.arange(-self.max_degree, self.max_degree + 2))
+        np.frombuffer(state.position, dtype=np.int32)[nodes] = \
+            np.arange(len(nodes)) - starts[gains + self.max_degree]
+        # The bucket lists are refilled in place, not allocated again
+        values = nodes.tolist()
+        starts = starts.tolist()
+        for i, bucket in enumerate(self.gains_storage):
+            bucket[:] = values[starts[i]:starts[i + 1]]
+        self.highest_gain = int(gains[-1]) if len(nodes) else -self.max_degree - 1
+        self.size = self.free_count = len(nodes)
 
     def get_nodes_at_gain(self, gain_value):
-        return self.gains_storage[gain_value]
+        return self.gains_storage[gain_value + self.max_degree]
 
     def save_node_at_gain(self, node, gain_value):
-        self.gains_storage[gain_value].add(node)
-        self.update_highest_gain()
+        state = self.state
+        if state.position[node] >= 0:
+            if state.gain[node] == gain_value:
+                return
+            self.remove_node_from_gains(node)
+        bucket = self.gains_storage[gain_value + self.max_degree]
+        state.position[node] = len(bucket)
+        state.gain[node] = gain_value
+        bucket.append(node)
+        if gain_value > self.highest_gain:
+            self.highest_gain = gain_value
+
+    def remove_node_from_gains(self, node):
+        state = self.state
+        position = state.position[node]
+        if position < 0:
+            return
+        bucket = self.gains_storage[state.gain[node] + self.max_degree]
+        state.position[node] = -1
+        # Fill the hole with the last node of the bucket to delete in O(1)
+        last = bucket.pop()
+        if last != node:
+            bucket[position] = last
+            state.position[last] = position
 
     def get_free_node_with_highest_gain(self):
-        nodes = [node for node in self.gains_storage[self.highest_gain] if self.freedoms[node]]
-        if not nodes:
-            self.highest_gain -= 1
-            return self.get_free_node_with_highest_gain()
-        else:
-            return nodes
+        self.update_highest_gain()
+        if self.highest_gain < -self.max_degree:
+            return []
+        return self.gains_storage[self.highest_gain + self.max_degree]
 
+    def pick_free_node_with_highest_gain(self):
+        # Random node among the ones with the highest gain
+        nodes = self.get_free_node_with_highest_gain()
+        return nodes[randint(0, len(nodes) - 1)]
 
     def lock_node(self, node):
-        self.freedoms[node] = False
+        if not self.state.locked[node]:
+            self.free_count -= 1
+        self.state.locked[node] = 1
+        self.remove_node_from_gains(node)
 
     def update_highest_gain(self):
-        for i in self.gains_storage.keys():
-            if self.gains_storage[i]:
-                self.highest_gain = i
+        while self.highest_gain >= -self.max_degree and \
+                not self.gains_storage[self.highest_gain + self.max_degree]:
+            self.highest_gain -= 1
 
     def remove_node(self, node):
-        self.nodes.remove(node)
-        del self.freedoms[node]
-        for gain, nodes in self.gains_storage.items():
-            if node in nodes:
-                self.gains_storage[gain].remove(node)
-        self.update_highest_gain()
-        
+        self.size -= 1
+        if not self.state.locked[node]:
+            self.free_count -= 1
+        self.remove_node_from_gains(node)
 
     def contains_node(self, node):
-        return node in self.nodes
-    
+        return self.state.side[node] == self.side
+
+    def is_free(self, node):
+        return not self.state.locked[node]
+
     def has_free_nodes(self):
-        return any(x for x in self.freedoms.values())
+        return self.free_count > 0
 
     def free_all_nodes(self):
-        for node in self.freedoms.keys():
-            self.freedoms[node] = True
+        # The locked flags are shared by both blocks and reset by the graph
+        self.free_count = self.size
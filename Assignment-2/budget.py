@@ -0,0 +1,60 @@
+from time import monotonic, thread_time
+
+
+class Budget:
+    # Limits on wall time, CPU time, FM passes and moves of one run. The FM
+    # code and the drivers call spend() at cheap points and stop when it
+    # returns True, so a run always ends between two moves with a consistent
+    # solution, in any thread or process. The wall time deadline is absolute
+    # (monotonic clock), so copies sent to pool workers share it, while CPU
+    # time and the counters are spent by each copy on its own.
+    __slots__ = ('wall_time', 'cpu_time', 'fm_passes', 'moves', 'check_every',
+                 'deadline', 'cpu_deadline', 'passes_spent', 'moves_spent', 'ticks', 'reason')
+
+    def __init__(self, wall_time=None, cpu_time=None, fm_passes=None, moves=None, check_every=64):
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.fm_passes = fm_passes
+        self.moves = moves
+        # The clocks are read once every check_every calls of spend()
+        self.check_every = check_every
+        self.start()
+
+    def start(self):
+        self.deadline = None if self.wall_time is None else monotonic() + self.wall_time
+        # CPU time is that of the thread that spends the budget, its clock
+        # starts on the first check
+        self.cpu_deadline = None
+        self.passes_spent = 0
+        self.moves_spent = 0
+        self.ticks = 0
+        self.reason = None
+
+    def spend(self, passes=0, moves=0):
+        self.passes_spent += passes
+        self.moves_spent += moves
+        self.ticks += 1
+        if self.reason is not None:
+            return True
+        if self.fm_passes is not None and self.passes_spent >= self.fm_passes:
+            self.reason = 'fm_passes'
+        elif self.moves is not None and self.moves_spent >= self.moves:
+            self.reason = 'moves'
+        elif passes or (self.ticks - 1) % self.check_every == 0:
+            self.check_clocks()
+        return self.reason is not None
+
+    def exhausted(self):
+        # Full check, for the drivers between two FM runs
+        if self.reason is None and not self.spend():
+            self.check_clocks()
+        return self.reason is not None
+
+    def check_clocks(self):
+        if self.deadline is not None and monotonic() >= self.deadline:
+            self.reason = 'wall_time'
+        elif self.cpu_time is not None:
+            if self.cpu_deadline is None:
+                self.cpu_deadline = thread_time() + self.cpu_time
+            elif thread_time() >= self.cpu_deadline:
+                self.reason = 'cpu_time'
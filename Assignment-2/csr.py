@@ -0,0 +1,77 @@
+import numpy as np
+from scipy import sparse
+
+
+class CSRGraph:
+    # Compressed sparse row adjacency. Nodes are 0 based and contiguous, the
+    # neighbours of node v are indices[indptr[v]:indptr[v + 1]] and labels[v]
+    # is the id of v in the input file.
+    def __init__(self, indptr, indices, labels=None, coordinates=None, degrees=None):
+        self.indptr = np.ascontiguousarray(indptr, dtype=np.int32)
+        self.indices = np.ascontiguousarray(indices, dtype=np.int32)
+        if degrees is None:
+            degrees = np.diff(self.indptr)
+        self.degrees = np.ascontiguousarray(degrees, dtype=np.int32)
+        if labels is None:
+            labels = np.arange(self.size, dtype=np.int32)
+        self.labels = np.ascontiguousarray(labels, dtype=np.int32)
+        # Positions of the nodes of geometric graphs, if known
+        self.coordinates = coordinates
+        # End points of every edge, computed on the first call to edges()
+        self.edge_ends = None
+        # scipy.sparse adjacency matrix, built on the first call to matrix()
+        self.sparse_matrix = None
+
+    @classmethod
+    def from_connections(cls, connections):
+        # connections maps every node id to the list of its neighbour ids
+        labels = np.array(sorted(connections), dtype=np.int32)
+        degrees = np.array([len(connections[node]) for node in labels.tolist()],
+                           dtype=np.int32)
+        neighbours = np.fromiter(
+            (neighbour for node in labels.tolist() for neighbour in connections[node]),
+            dtype=np.int32, count=int(degrees.sum()))
+        indptr = np.zeros(len(labels) + 1, dtype=np.int32)
+        np.cumsum(degrees, out=indptr[1:])
+        return cls(indptr, np.searchsorted(labels, neighbours), labels)
+
+    @property
+    def size(self):
+        return len(self.indptr) - 1
+
+    @property
+    def max_degree(self):
+        return int(self.degrees.max()) if self.size else 0
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.degrees.nbytes + self.labels.nbytes
+
+    def neighbours(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def edges(self):
+        # Every edge once (lowest end first) as two aligned arrays
+        if self.edge_ends is None:
+            sources = np.repeat(np.arange(self.size, dtype=np.int32), self.degrees)
+            keep = sources < self.indices
+            self.edge_ends = (sources[keep], self.indices[keep])
+        return self.edge_ends
+
+    def matrix(self):
+        # 0/1 adjacency matrix over the CSR arrays, for gains of many nodes
+        # or partitions in one product
+        if self.sparse_matrix is None:
+            data = np.ones(len(self.indices), dtype=np.int32)
+            self.sparse_matrix = sparse.csr_matrix((data, self.indices, self.indptr),
+                                                  shape=(self.size, self.size))
+        return self.sparse_matrix
+
+    def to_index(self, labels):
+        # Node ids from the input file to 0 based node indices
+        return np.searchsorted(self.labels, labels)
+
+    def to_connections(self):
+        labels = self.labels.tolist()
+        return {labels[node]: [labels[neighbour] for neighbour in self.neighbours(node).tolist()]
+                for node in range(self.size)}
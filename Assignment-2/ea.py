@@ -1,106 +1,65 @@
-import random
 import numpy as np
-from scipy.spatial.distance import hamming
+
+from partition import Partition
+from population import UNEVALUATED, Population
 
 #random.seed(673)
 
 
 class GLS:
-    def __init__(self, population_size):
+    def __init__(self, population_size, length=500):
         # Create population
-        self.population = self.generate_population(length=500, size=population_size)
+        self.population = self.generate_population(length=length, size=population_size)
 
     def generate_population(self, length=500, size=50):
-        def get_binary_string(length):
-            person = []
-            for i in range(length):
-                # Create the person
-                person = np.random.choice(np.concatenate([[1]*250,[0]*250]), length, replace = False)
-            return person
-        return [get_binary_string(length) for i in range(size)]
+        # Balanced random individuals, not evaluated yet. The drivers improve
+        # them with FM and replace the Population with the results.
+        population = Population(size, length)
+        for i in range(size):
+            population.add(Partition.random(length), UNEVALUATED)
+        return population
 
     def crossover(self, length=500):
-        # Uniform crossover
-        child = []
-        index_free_bits = []
-
-        # Get the indeces for the parents
-        self.parents = random.sample(self.population, 2)
+        # Uniform crossover of one random pair of parents
+        return self.crossover_batch(1)[0]
 
-        # Compute hamming distance
-        parents_distance = hamming(self.parents[0], self.parents[1])
+    def crossover_batch(self, count):
+        # Uniform crossover of count random pairs of distinct parents at once,
+        # one child per row
+        size = len(self.population)
+        first = np.random.randint(0, size, count)
+        second = np.random.randint(0, size - 1, count)
+        second += second >= first
+        self.parents = (first, second)
+        return GLS.uniform_crossover(self.population.matrix[first], self.population.matrix[second])
 
+    @staticmethod
+    def uniform_crossover(first_parents, second_parents):
+        length = first_parents.shape[1]
         # If hamming distance higher than l/2 change all the bits of one parent
-        if parents_distance > 0.5:
-            new_parent = [1 if number == 0 else 0 for number in self.parents[0]]
-        else:
-            new_parent = self.parents[0]
-        # Check whether both parents are equal
-        if self.parents[1] == new_parent:
-            return new_parent
-        else:
-            # If they are not create the new child
-            # If the parents bit is the same append that one if not choose one randomly
-            for i in range(len(new_parent)):
-                if new_parent[i] == self.parents[1][i]:
-                    child.append(new_parent[i])
-                else:
-                    child.append(random.randint(0,1))
-                    index_free_bits.append(i)
-            # Check that the child does not break the equality criterion
-            return GLS.check_equality(length, index_free_bits, child)
+        distance = np.count_nonzero(first_parents != second_parents, axis=1)
+        first_parents = np.where((2 * distance > length)[:, None], 1 - first_parents, first_parents)
+        # Bits the parents agree on are kept, the others are chosen randomly
+        free = first_parents != second_parents
+        children = np.where(free, np.random.randint(0, 2, free.shape), first_parents).astype(np.int8)
+        return GLS.repair_balance(children, free).view(Partition)
 
     @staticmethod
-    def check_equality(length, possible_indeces, individual):
-        # Check the number of ones
-        if sum(individual) != (length/2):
-            # Calculate the number of changes to fix the kid
-            number_changes = int(abs((length/2) - sum(individual)))
-            # Check which bits can be changed
-            # Bits selected randomly can be changed, the other bits are fixed
-            change = random.sample(possible_indeces, number_changes)
-            for i in change:
-                if individual[i] == 1:
-                    individual[i] = 0
-                else:
-                    individual[i] = 1
-        return individual
-
-    def create_new_population(self, length, new_child, child_cutstate, ranked_population):
-        new_population = self.population
-        # k is a variable to avoid copying the kid more than once if there are duplicates
-        k = 0
-        # Get worst cutstate
-        worst_cutstate = max(ranked_population.keys())
-        # Get the worst individual
-        contestant = ranked_population[worst_cutstate]
-        # Check if there are more than one individual with the worse cutstate
-        # if so choose one of them
-        if len(ranked_population[worst_cutstate]) > 1:
-            contestant = contestant[random.randint(0, (len(ranked_population[worst_cutstate])-1))]
-        if len(ranked_population[worst_cutstate]) == 1:
-            contestant = contestant[0]
-        # Make the worst contestant compete with the child
-        if child_cutstate <= worst_cutstate:
-            # Get the index of the worst contestant
-            idx = new_population.index(contestant)
-            # Change the worst contestant for the child in the population
-            new_population[idx] = new_child
-            # Append the new child to the cutstates dictionary
-            if child_cutstate in ranked_population:
-                ranked_population[child_cutstate].append(new_child)
-            else:
-                ranked_population[child_cutstate] = [new_child]
-            # Delete worst contestant
-            if len(ranked_population[worst_cutstate]) == 1:
-                ranked_population.pop(worst_cutstate)
-            else:
-                idx_contestant = ranked_population[worst_cutstate].index(contestant)
-                del ranked_population[worst_cutstate][idx_contestant]
-        # Update the population
-        self.population = new_population
-        return ranked_population
+    def repair_balance(children, free):
+        # Flip randomly chosen free bits of the surplus value until every
+        # child has length // 2 ones. Bits that may not flip get an infinite
+        # key, the need smallest keys of a row are flipped.
+        length = children.shape[1]
+        excess = children.sum(axis=1, dtype=np.int64) - length // 2
+        surplus = (excess > 0).astype(np.int8)[:, None]
+        keys = np.where(free & (children == surplus), np.random.random(children.shape), np.inf)
+        ranks = np.empty(children.shape, dtype=np.int64)
+        np.put_along_axis(ranks, np.argsort(keys, axis=1), np.arange(length)[None, :], axis=1)
+        flip = (ranks < np.abs(excess)[:, None]) & np.isfinite(keys)
+        children[flip] ^= 1
+        return children
 
-    def transform_person(self, person):
-        # Change from list to dictionary to use the person as input for the FM
-        return  {i + 1: person[i] for i in range(len(person))}
+    def create_new_population(self, new_child, child_cutstate):
+        # The child replaces the worst individual of the population (a
+        # Population) if it is not worse, returns the slot it took or None
+        return self.population.replace_worst(new_child, child_cutstate)
@@ -7,40 +7,14 @@ import pandas as pd
 from tqdm import tqdm
 
 from ea import *
+from population import Population
 from graph import *
-
-
-def read_graph_data(filename):
-    connections = {}
-    nodes = []
-    degrees = {}
-    freedoms = {}
-    with open(filename) as f:
-        for line in f:
-            l = line.split()
-            if len(l) > 0:
-                node, degree, neighbours = int(l[0]), int(l[2]), [
-                    int(x) for x in l[3:]]
-                connections[node] = neighbours
-                freedoms[node] = True
-                nodes.append(node)
-                degrees[node] = degree
-
-    return nodes, connections, degrees, freedoms
-
-
-def transform_results(results_dict):
-    new_child = []
-    cutstate = results_dict['cutstate']
-    solution_dict = results_dict['solution']
-    for i in sorted(solution_dict.keys()):
-        new_child.append(solution_dict[i])
-    return cutstate, new_child
+from loader import load_graph
 
 
 if __name__ == '__main__':
 
-    nodes, connections, degrees, freedoms = read_graph_data('Graph500.txt')
+    csr = load_graph('Graph500.txt')
     data_storage = join('data', 'gls')
     performance_stats = pd.DataFrame()
     solutions = pd.DataFrame(columns = ['Cutstate'])
@@ -49,37 +23,32 @@ if __name__ == '__main__':
         tic = perf_counter()
         best_solution = {}
         # Create gls and graph object
-        gls = GLS(population_size=50)
-        graph = Graph(nodes=nodes, connections=connections, freedoms=freedoms, degrees=degrees)    
+        gls = GLS(population_size=50, length=csr.size)
+        graph = Graph(csr=csr)    
 
         # Improve population by running the FM on each individual once
-        ranked_population = {}
-        improved_population = []
+        population = Population(len(gls.population), csr.size)
         for individual in tqdm(gls.population, desc='Population improvement'):
-            graph.init_partition(gls.transform_person(individual))
+            graph.init_partition(individual)
             graph.setup_gains()
             result = graph.fiduccia_mattheyses()
-            cutstate, solution = transform_results(result)
-            improved_population.append(solution)
-            if cutstate in ranked_population:
-                ranked_population[cutstate].append(solution)
-            else:
-                ranked_population[cutstate] = [solution]
+            cutstate, solution = result['cutstate'], result['solution']
+            population.add(solution, cutstate)
         # Update the population with the improved one
-        gls.population = improved_population
+        gls.population = population
 
         # Create children
         for i in tqdm(range(2450), desc='Fiducca Mattheyses experiments'):
             # Create child
             child = gls.crossover()
             # Compute FM
-            graph.init_partition(gls.transform_person(child))
+            graph.init_partition(child)
             graph.setup_gains()
             result = graph.fiduccia_mattheyses()
-            child_cutstate, new_child = transform_results(result)
+            child_cutstate, new_child = result['cutstate'], result['solution']
             # Create new population
-            ranked_population = gls.create_new_population(500, new_child, child_cutstate, ranked_population)
-        solutions = solutions.append({'Cutstate': sorted(ranked_population.keys())}, ignore_index=True)
+            gls.create_new_population(new_child, child_cutstate)
+        solutions = solutions.append({'Cutstate': population.ranked_cutstates()}, ignore_index=True)
         toc = perf_counter()
         performance_stats = performance_stats.append({'Execution Time': toc - tic}, ignore_index=True)
         
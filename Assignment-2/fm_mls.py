@@ -5,36 +5,22 @@ import pandas as pd
 from tqdm import tqdm
 
 from graph import *
-
-
-def read_graph_data(filename):
-    connections = {}
-    nodes = []
-    degrees = {}
-    freedoms = {}
-    with open(filename) as f:
-        for line in f:
-            l = line.split()
-            if len(l) > 0:
-                node, degree, neighbours = int(l[0]), int(l[2]), [
-                    int(x) for x in l[3:]]
-                connections[node] = neighbours
-                freedoms[node] = True
-                nodes.append(node)
-                degrees[node] = degree
-
-    return nodes, connections, degrees, freedoms
+from instrumentation import instrumented, save_summaries, summary_filename
+from loader import load_graph
 
 
 if __name__ == '__main__':
 
-    nodes, connections, degrees, freedoms = read_graph_data(
-        'Graph500.txt')
+    csr = load_graph('Graph500.txt')
     data_storage = join('data', 'mls')
     performance_stats = pd.DataFrame()
     solutions = pd.DataFrame()
+    # With instrument = True every run also gets an FMStats summary
+    instrument = False
+    graph_class = instrumented(Graph) if instrument else Graph
+    summaries = []
     for j in range(25):
-        graph = Graph(nodes=nodes, connections=connections, freedoms=freedoms, degrees=degrees)
+        graph = graph_class(csr=csr)
         tic = perf_counter()
         previous_solution = {}
 
@@ -50,7 +36,7 @@ if __name__ == '__main__':
 
 
 
-        solution = previous_solution['solution']
+        solution = previous_solution['solution'].to_solution(csr)
         solution['cutstate'] = previous_solution['cutstate']
         print(solution['cutstate'])
         solutions = solutions.append(
@@ -58,7 +44,11 @@ if __name__ == '__main__':
         toc = perf_counter()
         performance_stats = performance_stats.append(
             {'Execution Time': toc - tic}, ignore_index=True)
+        if instrument:
+            summaries.append(graph.stats.summary())
         del graph
     solutions.to_csv(join(data_storage, f'mls_with_fm.csv'))
     performance_stats.to_csv(
-        join(data_storage, f'mls_with_fm_performance.csv'))
\ No newline at end of file
+        join(data_storage, f'mls_with_fm_performance.csv'))
+    if instrument:
+        save_summaries(summaries, summary_filename(join(data_storage, f'mls_with_fm_performance.csv')))
@@ -0,0 +1,102 @@
+import argparse
+
+import numpy as np
+
+from csr import CSRGraph
+from loader import cache_key, save_graph
+
+# Cells checked for every cell: itself and the forward half of its ring, so
+# each pair of neighbouring cells is visited once
+CELL_OFFSETS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def radius_for_degree(size, average_degree):
+    # Expected degree of a random geometric graph in the unit square
+    return np.sqrt(average_degree / (np.pi * size))
+
+
+def geometric_edges(points, radius, batch_size=1 << 18):
+    # Pairs of points closer than radius, found through a grid of cells of
+    # side radius. Candidates are generated for batch_size points at a time
+    # so memory stays bounded for large graphs.
+    cells_per_side = max(1, int(1 / radius))
+    cells = np.minimum((points / (1 / cells_per_side)).astype(np.int64), cells_per_side - 1)
+    cell_ids = cells[:, 0] * cells_per_side + cells[:, 1]
+    order = np.argsort(cell_ids, kind='stable')
+    points = points[order]
+    cells = cells[order]
+    starts = np.searchsorted(cell_ids[order], np.arange(cells_per_side ** 2 + 1))
+
+    sources = []
+    targets = []
+    for first in range(0, len(points), batch_size):
+        nodes = np.arange(first, min(first + batch_size, len(points)))
+        for dx, dy in CELL_OFFSETS:
+            x = cells[nodes, 0] + dx
+            y = cells[nodes, 1] + dy
+            inside = (x >= 0) & (x < cells_per_side) & (y >= 0) & (y < cells_per_side)
+            candidates = nodes[inside]
+            neighbour_cells = x[inside] * cells_per_side + y[inside]
+            counts = starts[neighbour_cells + 1] - starts[neighbour_cells]
+            if not counts.sum():
+                continue
+            u = np.repeat(candidates, counts)
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            v = np.repeat(starts[neighbour_cells], counts) + offsets
+            keep = np.sum((points[u] - points[v]) ** 2, axis=1) < radius ** 2
+            if dx == 0 and dy == 0:
+                keep &= u < v
+            sources.append(u[keep])
+            targets.append(v[keep])
+    sources = order[np.concatenate(sources)] if sources else np.zeros(0, dtype=np.int64)
+    targets = order[np.concatenate(targets)] if targets else np.zeros(0, dtype=np.int64)
+    return sources, targets
+
+
+def random_geometric_graph(size, radius=None, average_degree=5, seed=0):
+    # Nodes are uniform points in the unit square, connected when closer than
+    # radius. Labels start at 1 as in Graph500.txt.
+    rng = np.random.default_rng(seed)
+    if radius is None:
+        radius = radius_for_degree(size, average_degree)
+    points = rng.random((size, 2))
+    sources, targets = geometric_edges(points, radius)
+
+    # Both directions of every edge, grouped by source
+    ends = np.concatenate([sources, targets])
+    others = np.concatenate([targets, sources])
+    order = np.argsort(ends)
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ends, minlength=size), out=indptr[1:])
+    return CSRGraph(indptr, others[order], np.arange(1, size + 1), points)
+
+
+def write_graph(csr, filename, binary=True):
+    # Same format as Graph500.txt, plus the binary cache read by load_graph
+    labels = csr.labels.tolist()
+    indptr = csr.indptr.tolist()
+    neighbours = csr.labels[csr.indices].tolist()
+    with open(filename, 'w') as f:
+        for node, (x, y) in enumerate(csr.coordinates.tolist()):
+            row = neighbours[indptr[node]:indptr[node + 1]]
+            f.write(f'{labels[node]:4d} ({x:.6f},{y:.6f}) {len(row):3d} '
+                    + ' '.join(map(str, row)) + '\n')
+    if binary:
+        save_graph(csr, f'{filename}.npz', cache_key(filename))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Random geometric graph in the Graph500.txt format')
+    parser.add_argument('size', type=int)
+    parser.add_argument('--radius', type=float)
+    parser.add_argument('--degree', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    arguments = parser.parse_args()
+
+    csr = random_geometric_graph(arguments.size, arguments.radius, arguments.degree, arguments.seed)
+    output = arguments.output or f'Graph{arguments.size}_{arguments.seed}.txt'
+    write_graph(csr, output)
+    print(f'{output}: {csr.size} nodes, {len(csr.indices) // 2} edges, '
+          f'average degree {csr.degrees.mean():.2f}')
@@ -1,17 +1,34 @@
 from random import shuffle, randint, seed
+
+import numpy as np
 from tqdm import tqdm
 from block import Block
+from csr import CSRGraph
+from partition import Partition, PartitionState
 from operator import itemgetter
 
 
 class Graph:
-    def __init__(self, nodes=[], degrees=[], connections={}, freedoms={}):
+    # Block type of the workspace, instrumentation.py swaps in a counting one
+    block_class = Block
+
+    def __init__(self, nodes=[], degrees=[], connections={}, freedoms={}, csr=None):
         self.nodes = nodes
         self.degrees = degrees
         self.connections = connections
         self.freedoms = freedoms
+        # Adjacency used by the FM code, built from connections when not given
+        self.csr = csr
+        self.edges = None
+        self.state = None
+        self.cutstate = None
         self.block_a = None
         self.block_b = None
+        # Partition, gains and cutstate of the last setup_gains, the start of
+        # reinit_partition
+        self.base_side = None
+        self.base_gain = None
+        self.base_cutstate = None
 
         self.best_solution = []
         self.best_cutstate = None
@@ -19,148 +36,267 @@ class Graph:
         self.current_solution = []
         self.current_cutstate = None
 
+    def reset_solutions(self):
+        # Forget the solutions of earlier FM runs on this graph
+        self.best_solution = []
+        self.best_cutstate = None
+        self.current_solution = []
+        self.current_cutstate = None
+
     def add_node(self, new_node_id, degree):
         self.nodes.append(new_node_id)
         self.degrees.append(degree)
         self.freedoms[new_node_id] = True
+        self.csr = None
 
     def remove_node(self, node):
         self.nodes.remove(node)
+        self.csr = None
 
     def add_connection(self, node, connections):
         self.connections[node] = connections
+        self.csr = None
 
-    def init_partition(self, previous_solution={}):
-        count_b_block = 0
-        if previous_solution:
-            nodes_1 = []
-            nodes_2 = []
-            freedoms_1 = {}
-            freedoms_2 = {}
-            count = 0
-            for i, (node, in_a) in enumerate(previous_solution.items()):
-                if in_a:
-                    nodes_1.append(node)
-                    freedoms_1[node] = True
-                else:
-                    count_b_block += 1
-                    nodes_2.append(node)
-                    freedoms_2[node] = True
-            self.block_a = Block(
-                nodes=nodes_1, freedoms=freedoms_1, max_degree=max(self.degrees))
-            self.block_b = Block(
-                nodes=nodes_2, freedoms=freedoms_2, max_degree=max(self.degrees))
-        else:
-            shuffle(self.nodes)
-            halfway = len(self.nodes) // 2
-            nodes_1 = self.nodes[:halfway]
-            nodes_2 = self.nodes[halfway:]
+    def setup_adjacency(self):
+        if self.csr is None:
+            self.csr = CSRGraph.from_connections(self.connections)
+        # Slices of memoryviews iterate as plain ints without copying
+        self.offsets = memoryview(self.csr.indptr)
+        self.adjacency = memoryview(self.csr.indices)
+        self.edges = self.csr.edges()
+        self.base_side = None
+        self.state = None
 
-            freedoms_1 = {k: v for k, v in self.freedoms.items()
-                          if k in nodes_1}
-            freedoms_2 = {k: v for k, v in self.freedoms.items()
-                          if k in nodes_2}
+    def allocate_workspace(self):
+        # Partition state, blocks and buffers, allocated once per graph and
+        # reset by every init_partition
+        max_degree = self.csr.max_degree
+        self.state = PartitionState(self.csr.size)
+        self.block_a = self.block_class(side=1, state=self.state, max_degree=max_degree)
+        self.block_b = self.block_class(side=0, state=self.state, max_degree=max_degree)
+        self.order = list(range(self.csr.size))
+        self.random_partition = np.zeros(self.csr.size, dtype=np.int8)
 
-            self.block_a = Block(
-                nodes=nodes_1, freedoms=freedoms_1, max_degree=max(self.degrees))
-            self.block_b = Block(
-                nodes=nodes_2, freedoms=freedoms_2, max_degree=max(self.degrees))
+    def init_partition(self, previous_solution={}):
+        if self.csr is None or self.edges is None:
+            self.setup_adjacency()
+        if self.state is None or self.state.size != self.csr.size:
+            self.allocate_workspace()
+        else:
+            self.state.reset()
+            self.block_a.clear()
+            self.block_b.clear()
+        # previous_solution is a Partition (any array of sides by node index)
+        # or a solution dict, without it the partition is random
+        if isinstance(previous_solution, np.ndarray):
+            partition = previous_solution
+        elif previous_solution:
+            partition = Partition.from_solution(previous_solution, self.csr)
+        else:
+            nodes = self.order
+            nodes[:] = range(self.csr.size)
+            shuffle(nodes)
+            partition = self.random_partition
+            partition[:] = 0
+            partition[nodes[:len(nodes) // 2]] = 1
+        np.frombuffer(self.state.side, dtype=np.int8)[:] = partition
+        in_a = int(np.count_nonzero(partition))
+        self.block_a.add_free_nodes(in_a)
+        self.block_b.add_free_nodes(self.csr.size - in_a)
+        self.cutstate = self.get_cutstate()
+        self.start_pass()
 
     def setup_gains(self):
-        for node in self.nodes:
-            if self.block_a.contains_node(node) and self.block_a.freedoms[node]:
+        # Gains of the free nodes. When every node is free, as after
+        # init_partition, they come from one sparse product: a node with same
+        # neighbours in its own block has gain deg - 2 * same.
+        if self.block_a.free_count + self.block_b.free_count == self.csr.size:
+            side = np.frombuffer(self.state.side, dtype=np.int8)
+            ones = self.csr.matrix() @ side.astype(np.int32)
+            same = np.where(side == 1, ones, self.csr.degrees - ones)
+            np.frombuffer(self.state.gain, dtype=np.int32)[:] = self.csr.degrees - 2 * same
+            self.block_a.fill(np.flatnonzero(side == self.block_a.side))
+            self.block_b.fill(np.flatnonzero(side == self.block_b.side))
+            self.save_base()
+            return
+        for node in range(self.csr.size):
+            if self.block_a.contains_node(node) and self.block_a.is_free(node):
                 gain = self.calculate_gain(node)
                 self.block_a.save_node_at_gain(node, gain)
-            elif self.block_b.contains_node(node) and self.block_b.freedoms[node]:
+            elif self.block_b.contains_node(node) and self.block_b.is_free(node):
                 gain = self.calculate_gain(node)
                 self.block_b.save_node_at_gain(node, gain)
 
+    def save_base(self):
+        # The gains of all nodes are exact when every node is free
+        self.base_side = np.frombuffer(self.state.side, dtype=np.int8).copy()
+        self.base_gain = np.frombuffer(self.state.gain, dtype=np.int32).copy()
+        self.base_cutstate = self.cutstate
+
+    def reinit_partition(self, partition):
+        # init_partition(partition) followed by setup_gains(), computed from
+        # the partition of the last setup_gains by moving only the nodes that
+        # differ, as after an ILS perturbation of the last local optimum.
+        # Only the neighbours of those nodes get new gains.
+        if self.base_side is None or self.state is None:
+            moved = None
+        else:
+            moved = np.flatnonzero(self.base_side != partition)
+        if moved is None or 4 * len(moved) > self.csr.size:
+            self.init_partition(partition)
+            self.setup_gains()
+            return
+        np.frombuffer(self.state.side, dtype=np.int8)[:] = self.base_side
+        np.frombuffer(self.state.gain, dtype=np.int32)[:] = self.base_gain
+        self.cutstate = self.base_cutstate
+        self.flip_nodes(moved.tolist())
+        self.state.free_all_nodes()
+        side = np.frombuffer(self.state.side, dtype=np.int8)
+        self.block_a.fill(np.flatnonzero(side == self.block_a.side))
+        self.block_b.fill(np.flatnonzero(side == self.block_b.side))
+        self.start_pass()
+        self.save_base()
+
+    def flip_nodes(self, nodes):
+        # Moves nodes to the other block keeping the gains of all nodes and
+        # the cutstate exact, without touching the blocks
+        side = self.state.side
+        gain = self.state.gain
+        for node in nodes:
+            node_side = side[node]
+            self.cutstate -= gain[node]
+            gain[node] = -gain[node]
+            side[node] = 1 - node_side
+            for neighbour in self.adjacency[self.offsets[node]:self.offsets[node + 1]]:
+                if side[neighbour] == node_side:
+                    gain[neighbour] += 2
+                else:
+                    gain[neighbour] -= 2
+
     def calculate_gain(self, node):
         gain = 0
-
-        node_block = self.block_a if self.block_a.contains_node(
-            node) else self.block_b
-        for neighbour in self.connections[node]:
-            if node_block.contains_node(neighbour):
+        side = self.state.side
+        node_side = side[node]
+        for neighbour in self.adjacency[self.offsets[node]:self.offsets[node + 1]]:
+            if side[neighbour] == node_side:
                 gain -= 1
             else:
                 gain += 1
         return gain
 
-    def get_solution(self):
-        solution = {}
-        for node in self.nodes:
-            if self.block_a.contains_node(node):
-                solution[node] = 1
+    def update_neighbour_gains(self, node, source_block, target_block):
+        # Edges to the source block become cut (+2), edges to the target block
+        # stop being cut (-2). Locked neighbours are not in the gain buckets.
+        side = self.state.side
+        gain = self.state.gain
+        position = self.state.position
+        for neighbour in self.adjacency[self.offsets[node]:self.offsets[node + 1]]:
+            if position[neighbour] < 0:
+                continue
+            if side[neighbour] == source_block.side:
+                source_block.save_node_at_gain(neighbour, gain[neighbour] + 2)
             else:
-                solution[node] = 0
-        return solution
+                target_block.save_node_at_gain(neighbour, gain[neighbour] - 2)
+
+    def get_solution(self):
+        # Solutions are keyed by the node ids of the input file
+        return dict(zip(self.csr.labels.tolist(), self.state.side.tolist()))
+
+    def get_partition(self):
+        # Copy of the current sides, the state changes with every move
+        return Partition(np.frombuffer(self.state.side, dtype=np.int8).copy())
 
     def get_cutstate(self):
-        cutstate = 0
-        seen = []
-        for node in self.nodes:
-            connections = self.connections[node]
-            for neighbour in connections:
-                if frozenset((node, neighbour)) in seen:
-                    continue
-                node_block = self.block_a if self.block_a.contains_node(
-                    node) else self.block_b
-                if not all([node_block.contains_node(cell) for cell in (node, neighbour)]):
-                    cutstate += 1
-                seen.append(frozenset((node, neighbour)))
-        return cutstate
+        # Full recount, the FM moves keep self.cutstate up to date instead
+        side = np.frombuffer(self.state.side, dtype=np.int8)
+        ends_u, ends_v = self.edges
+        return int(np.count_nonzero(side[ends_u] != side[ends_v]))
+
+    def free_all_nodes(self):
+        self.state.free_all_nodes()
+        self.block_a.free_all_nodes()
+        self.block_b.free_all_nodes()
 
     def update_solution(self):
-        new_cutstate = self.get_cutstate()
+        new_cutstate = self.cutstate
         if self.current_cutstate is not None:
             if new_cutstate < self.current_cutstate:
-                self.current_solution = self.get_solution()
+                self.current_solution = self.get_partition()
                 self.current_cutstate = new_cutstate
         else:
-            self.current_solution = self.get_solution()
+            self.current_solution = self.get_partition()
             self.current_cutstate = new_cutstate
 
-    def swap(self):
-        largest_block = self.block_a if self.block_a.size > self.block_b.size else self.block_b
-        possible_nodes = largest_block.get_free_node_with_highest_gain()
-        node_index = randint(0, (len(possible_nodes)-1))
-        node = possible_nodes[node_index]
+    def start_pass(self):
+        # Move log of the pass and the best balanced prefix seen so far
+        self.moves = []
+        self.pass_gain = 0
+        self.best_pass_gain = 0
+        self.best_prefix = 0
 
-        # Remove node from current block and move it to the other one
-        largest_block.remove_node(node)
-        other_block = self.block_a if self.block_a.size > self.block_b.size else self.block_b
+    def move_node(self, node, source_block, target_block):
+        gain = self.state.gain[node]
+        self.cutstate -= gain
+        self.pass_gain += gain
+        self.moves.append(node)
 
-        # Mark moved node as not free
-        other_block.add_node(node, False)
-        other_block.lock_node(node)
+        # Remove node from current block, move it to the other one and lock it
+        source_block.remove_node(node)
+        target_block.add_node(node, False)
 
-        # Updated gains using self.setup_gains
-        self.setup_gains()
+        # Only the gains of the neighbours of the moved node change
+        self.update_neighbour_gains(node, source_block, target_block)
 
-        # Select new node
-        possible_nodes = other_block.get_free_node_with_highest_gain()
-        node_index = randint(0, (len(possible_nodes)-1))
-        node = possible_nodes[node_index]
+    def rollback(self):
+        # Undo the moves after the best prefix, newest first. Moved nodes are
+        # locked, so the gain buckets are not touched.
+        side = self.state.side
+        for node in reversed(self.moves[self.best_prefix:]):
+            if side[node] == self.block_a.side:
+                self.block_a.remove_node(node)
+                self.block_b.add_node(node, False)
+            else:
+                self.block_b.remove_node(node)
+                self.block_a.add_node(node, False)
+        del self.moves[self.best_prefix:]
+        self.cutstate += self.pass_gain - self.best_pass_gain
+        self.pass_gain = self.best_pass_gain
 
-        # Remove node from current block
-        other_block.remove_node(node)
+    def swap(self):
+        largest_block = self.block_a if self.block_a.size > self.block_b.size else self.block_b
+        other_block = self.block_b if largest_block is self.block_a else self.block_a
 
-        # Move it to the other block and Set node to false
-        largest_block.add_node(node, False)
-        largest_block.lock_node(node)
+        node = largest_block.pick_free_node_with_highest_gain()
+        self.move_node(node, largest_block, other_block)
+
+        # Select new node
+        node = other_block.pick_free_node_with_highest_gain()
+        self.move_node(node, other_block, largest_block)
 
-        # Gains update
-        self.setup_gains()
+        # Both blocks are back to their sizes, remember the best prefix
+        if self.pass_gain > self.best_pass_gain:
+            self.best_pass_gain = self.pass_gain
+            self.best_prefix = len(self.moves)
 
-        # Calculate new solution
-        self.update_solution()
+    def fm_pass(self, budget=None, cutoff=None):
+        # With a cutoff the pass ends after cutoff moves without a new best
+        # prefix. A pass stopped early is rolled back like a finished one.
+        self.start_pass()
+        while self.block_a.has_free_nodes() and self.block_b.has_free_nodes():
+            self.swap()
+            if budget is not None and budget.spend(moves=2):
+                break
+            if cutoff is not None and len(self.moves) - self.best_prefix >= cutoff:
+                break
+        self.rollback()
 
-    def fiduccia_mattheyses(self):
+    def fiduccia_mattheyses(self, budget=None, cutoff=None):
         keep_searching = True
         while keep_searching:
-            while self.block_a.has_free_nodes() and self.block_b.has_free_nodes():
-                self.swap()
+            self.fm_pass(budget, cutoff)
+            self.update_solution()
+            if budget is not None and budget.spend(passes=1):
+                break
 
             if self.best_cutstate is not None:
                 if self.best_cutstate > self.current_cutstate:
@@ -171,8 +307,7 @@ class Graph:
             else:
                 self.best_cutstate = self.current_cutstate
                 self.best_solution = self.current_solution
-            self.block_a.free_all_nodes()
-            self.block_b.free_all_nodes()
+            self.free_all_nodes()
             self.setup_gains()
 
         return {'solution': self.current_solution, 'cutstate': self.current_cutstate}
@@ -0,0 +1,167 @@
+import cProfile
+import json
+import pstats
+from contextlib import contextmanager
+from time import perf_counter
+
+from block import Block
+
+PHASES = ('init', 'gains', 'moves', 'cut')
+
+
+class FMStats:
+    # Counters and per phase times of the FM runs of one instrumented graph.
+    # Phase times are exclusive: a phase started inside another one (the cut
+    # recount in init_partition, setup_gains in reinit_partition) pauses it.
+    def __init__(self):
+        self.moves = 0
+        self.gain_updates = 0
+        self.bucket_scans = 0
+        self.passes = 0
+        self.fm_calls = 0
+        self.max_passes = 0
+        self.rollbacks = 0
+        self.rolled_back = 0
+        self.max_rollback = 0
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.phases = []
+        self.started = None
+
+    def start(self, phase):
+        now = perf_counter()
+        if self.phases:
+            self.seconds[self.phases[-1]] += now - self.started
+        self.phases.append(phase)
+        self.started = now
+
+    def stop(self):
+        now = perf_counter()
+        self.seconds[self.phases.pop()] += now - self.started
+        self.started = now
+
+    def summary(self):
+        return {
+            'moves': self.moves,
+            'gain_updates': self.gain_updates,
+            'bucket_scans': self.bucket_scans,
+            'fm_calls': self.fm_calls,
+            'passes': self.passes,
+            'mean_passes_per_call': self.passes / self.fm_calls if self.fm_calls else 0.0,
+            'max_passes_per_call': self.max_passes,
+            'rolled_back_moves': self.rolled_back,
+            'mean_rollback_depth': self.rolled_back / self.rollbacks if self.rollbacks else 0.0,
+            'max_rollback_depth': self.max_rollback,
+            'seconds': dict(self.seconds),
+        }
+
+
+class InstrumentedBlock(Block):
+    # Block that counts bucket updates and the buckets looked at while
+    # searching the highest gain into the FMStats of its graph
+    stats = None
+
+    def save_node_at_gain(self, node, gain_value):
+        self.stats.gain_updates += 1
+        super().save_node_at_gain(node, gain_value)
+
+    def update_highest_gain(self):
+        highest_gain = self.highest_gain
+        super().update_highest_gain()
+        self.stats.bucket_scans += highest_gain - self.highest_gain + 1
+
+
+class InstrumentedGraph:
+    # Mixin over a Graph class that fills self.stats. The plain classes are
+    # left untouched, so FM without instrumentation pays nothing for it.
+    block_class = InstrumentedBlock
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = FMStats()
+
+    def allocate_workspace(self):
+        super().allocate_workspace()
+        self.block_a.stats = self.block_b.stats = self.stats
+
+    def timed(self, phase, method, *args):
+        self.stats.start(phase)
+        try:
+            return method(*args)
+        finally:
+            self.stats.stop()
+
+    def init_partition(self, previous_solution={}):
+        return self.timed('init', super().init_partition, previous_solution)
+
+    def reinit_partition(self, partition):
+        return self.timed('init', super().reinit_partition, partition)
+
+    def setup_gains(self):
+        return self.timed('gains', super().setup_gains)
+
+    def get_cutstate(self):
+        return self.timed('cut', super().get_cutstate)
+
+    def move_node(self, node, source_block, target_block):
+        self.stats.moves += 1
+        super().move_node(node, source_block, target_block)
+
+    # Move time is taken per swap and rollback rather than per fm_pass, so
+    # the faulty FM of graph.py, which calls swap() directly, is timed too
+    def swap(self):
+        return self.timed('moves', super().swap)
+
+    def fm_pass(self, budget=None, cutoff=None):
+        self.stats.passes += 1
+        return super().fm_pass(budget, cutoff)
+
+    def rollback(self):
+        depth = len(self.moves) - self.best_prefix
+        self.stats.rollbacks += 1
+        self.stats.rolled_back += depth
+        self.stats.max_rollback = max(self.stats.max_rollback, depth)
+        return self.timed('moves', super().rollback)
+
+    def fiduccia_mattheyses(self, *args, **kwargs):
+        passes = self.stats.passes
+        moves = self.stats.moves
+        result = super().fiduccia_mattheyses(*args, **kwargs)
+        # The faulty FM makes its swaps without fm_pass, as a single pass
+        # that is never rolled back
+        if self.stats.passes == passes and self.stats.moves > moves:
+            self.stats.passes += 1
+        self.stats.fm_calls += 1
+        self.stats.max_passes = max(self.stats.max_passes, self.stats.passes - passes)
+        return result
+
+
+def instrumented(graph_class):
+    # graph_class with FMStats counters, e.g. instrumented(Graph)(csr=csr)
+    return type('Instrumented' + graph_class.__name__, (InstrumentedGraph, graph_class), {})
+
+
+def summary_filename(performance_filename):
+    # data/mls/mls_with_fm_performance.csv -> data/mls/mls_with_fm_instrumentation.json
+    return performance_filename.replace('_performance.csv', '_instrumentation.json')
+
+
+def save_summaries(summaries, filename):
+    # One FMStats.summary() per run
+    with open(filename, 'w') as f:
+        json.dump(summaries, f, indent=2)
+
+
+@contextmanager
+def profiled(filename=None, sort='cumulative', lines=25):
+    # cProfile around a block of code. The stats go to filename (for pstats or
+    # snakeviz), without one the top lines are printed.
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        if filename is not None:
+            profile.dump_stats(filename)
+        else:
+            pstats.Stats(profile).sort_stats(sort).print_stats(lines)
@@ -0,0 +1,143 @@
+import os
+
+import numpy as np
+
+from csr import CSRGraph
+
+CACHE_VERSION = 1
+
+
+def parse_graph(filename):
+    # Lines look like `node (x,y) degree neighbour neighbour ...`
+    labels = []
+    coordinates = []
+    counts = []
+    tails = []
+    with open(filename) as f:
+        for number, line in enumerate(f, 1):
+            head, _, tail = line.partition(')')
+            if not tail:
+                if head.strip():
+                    raise ValueError(f'{filename}:{number}: malformed line {line!r}')
+                continue
+            node, _, point = head.partition('(')
+            x, _, y = point.partition(',')
+            count = len(tail.split()) - 1
+            if count < 0:
+                raise ValueError(f'{filename}:{number}: no degree after the coordinates {line!r}')
+            labels.append(int(node))
+            coordinates.append((float(x), float(y)))
+            counts.append(count)
+            tails.append(tail)
+
+    # Degrees and neighbours of every line are converted in a single call
+    values = np.fromstring(' '.join(tails), dtype=np.int64, sep=' ')
+    counts = np.array(counts, dtype=np.int64)
+    starts = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1] + 1, out=starts[1:])
+    degrees = values[starts]
+    neighbours = np.delete(values, starts)
+    return np.array(labels, dtype=np.int64), np.array(coordinates), degrees, counts, neighbours
+
+
+def label_index(sorted_labels, values):
+    # Position of every value in sorted_labels, direct when ids are contiguous
+    if len(sorted_labels) and sorted_labels[-1] - sorted_labels[0] == len(sorted_labels) - 1:
+        return values - sorted_labels[0]
+    return np.searchsorted(sorted_labels, values)
+
+
+def validate_graph(labels, degrees, counts, neighbours, filename=''):
+    wrong = np.flatnonzero(degrees != counts)
+    if len(wrong):
+        node = labels[wrong[0]]
+        raise ValueError(f'{filename}: node {node} has degree {degrees[wrong[0]]} '
+                         f'but {counts[wrong[0]]} neighbours')
+    order = np.argsort(labels)
+    if np.any(np.diff(labels[order]) == 0):
+        raise ValueError(f'{filename}: duplicated node ids')
+    sorted_labels = labels[order]
+    indices = label_index(sorted_labels, neighbours)
+    unknown = (indices < 0) | (indices >= len(labels))
+    unknown[~unknown] = sorted_labels[indices[~unknown]] != neighbours[~unknown]
+    if np.any(unknown):
+        raise ValueError(f'{filename}: unknown neighbour {neighbours[np.argmax(unknown)]}')
+    # Every edge u -> v needs its v -> u counterpart
+    sources = np.repeat(label_index(sorted_labels, labels), counts)
+    forward = np.sort(sources * len(labels) + indices)
+    backward = np.sort(indices * len(labels) + sources)
+    if not np.array_equal(forward, backward):
+        edge = np.setdiff1d(forward, backward)[0]
+        raise ValueError(f'{filename}: edge {sorted_labels[edge // len(labels)]} - '
+                         f'{sorted_labels[edge % len(labels)]} is not symmetric')
+    if np.any(sources == indices):
+        raise ValueError(f'{filename}: self loop at node {sorted_labels[sources[sources == indices][0]]}')
+
+
+def build_csr(labels, degrees, neighbours, coordinates=None):
+    # Rows in the order of the sorted node ids, so indices are contiguous
+    order = np.argsort(labels, kind='stable')
+    sorted_labels = labels[order]
+    starts = np.zeros(len(labels) + 1, dtype=np.int64)
+    np.cumsum(degrees, out=starts[1:])
+    indptr = np.zeros(len(labels) + 1, dtype=np.int64)
+    np.cumsum(degrees[order], out=indptr[1:])
+    # Position in neighbours of every entry of the reordered rows
+    source = np.repeat(starts[:-1][order] - indptr[:-1], degrees[order]) + np.arange(indptr[-1])
+    indices = label_index(sorted_labels, neighbours[source])
+    if coordinates is not None:
+        coordinates = coordinates[order]
+    return CSRGraph(indptr, indices, sorted_labels, coordinates)
+
+
+def cache_key(filename):
+    stat = os.stat(filename)
+    return np.array([CACHE_VERSION, stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+
+def save_graph(csr, filename, key=None):
+    arrays = {'indptr': csr.indptr, 'indices': csr.indices, 'labels': csr.labels}
+    if csr.coordinates is not None:
+        arrays['coordinates'] = csr.coordinates
+    if key is not None:
+        arrays['key'] = key
+    # Write next to the target and rename so readers never see half a file
+    temporary = f'{filename}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temporary, filename)
+
+
+def load_binary_graph(filename, key=None):
+    with np.load(filename) as data:
+        if key is not None and ('key' not in data or not np.array_equal(data['key'], key)):
+            return None
+        coordinates = data['coordinates'] if 'coordinates' in data else None
+        return CSRGraph(data['indptr'], data['indices'], data['labels'], coordinates)
+
+
+def load_graph(filename, cache=True, validate=True):
+    # Graph in the Graph500.txt format, the parsed arrays are cached in
+    # `<filename>.npz` and reused while the source file is unchanged
+    if filename.endswith('.npz'):
+        return load_binary_graph(filename)
+    cache_file = f'{filename}.npz'
+    key = cache_key(filename)
+    if cache and os.path.exists(cache_file):
+        try:
+            csr = load_binary_graph(cache_file, key)
+        except (OSError, ValueError, KeyError):
+            csr = None
+        if csr is not None:
+            return csr
+
+    labels, coordinates, degrees, counts, neighbours = parse_graph(filename)
+    if validate:
+        validate_graph(labels, degrees, counts, neighbours, filename)
+    csr = build_csr(labels, counts, neighbours, coordinates)
+    if cache:
+        try:
+            save_graph(csr, cache_file, key)
+        except OSError:
+            pass
+    return csr
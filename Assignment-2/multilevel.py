@@ -0,0 +1,294 @@
+import heapq
+from collections import deque
+from os import makedirs
+from os.path import join
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from graph_correct import Graph
+from loader import load_graph
+from partition import Partition
+
+
+class Level:
+    # Weighted CSR graph of one level of the hierarchy. cmap maps the nodes
+    # of this level to the nodes of the next coarser level.
+    def __init__(self, indptr, indices, edge_weights, node_weights):
+        self.indptr = indptr
+        self.indices = indices
+        self.edge_weights = edge_weights
+        self.node_weights = node_weights
+        self.degrees = np.diff(indptr)
+        self.sources = np.repeat(np.arange(self.size, dtype=np.int64), self.degrees)
+        self.cmap = None
+
+    @classmethod
+    def from_csr(cls, csr):
+        return cls(csr.indptr.astype(np.int64), csr.indices.astype(np.int64),
+                   np.ones(len(csr.indices), dtype=np.int64),
+                   np.ones(csr.size, dtype=np.int64))
+
+    @property
+    def size(self):
+        return len(self.indptr) - 1
+
+    def cutstate(self, side):
+        cut = side[self.sources] != side[self.indices]
+        return int(self.edge_weights[cut].sum()) // 2
+
+    def gains(self, side):
+        # Weight of the cut edges minus weight of the uncut edges per node
+        signs = np.where(side[self.sources] != side[self.indices], 1, -1)
+        return np.bincount(self.sources, weights=signs * self.edge_weights,
+                           minlength=self.size).astype(np.int64)
+
+
+def heavy_edge_matching(level, rng, rounds=4):
+    # Every free node proposes to its heaviest free neighbour (random tie
+    # break), mutual proposals are matched. A few rounds match most nodes.
+    match = np.full(level.size, -1, dtype=np.int64)
+    for _ in range(rounds):
+        free = match < 0
+        keep = free[level.sources] & free[level.indices]
+        if not keep.any():
+            break
+        sources = level.sources[keep]
+        targets = level.indices[keep]
+        keys = level.edge_weights[keep] + rng.random(len(sources))
+        order = np.lexsort((keys, sources))
+        sources = sources[order]
+        last = np.append(sources[1:] != sources[:-1], True)
+        proposers = sources[last]
+        choices = targets[order][last]
+        proposal = np.full(level.size, -1, dtype=np.int64)
+        proposal[proposers] = choices
+        mutual = proposal[choices] == proposers
+        match[proposers[mutual]] = choices[mutual]
+    unmatched = match < 0
+    match[unmatched] = np.flatnonzero(unmatched)
+    return match
+
+
+def contract(level, match):
+    nodes = np.arange(level.size)
+    leaders = np.minimum(nodes, match)
+    coarse_ids = np.cumsum(leaders == nodes) - 1
+    cmap = coarse_ids[leaders]
+    size = int(coarse_ids[-1]) + 1
+
+    # Parallel edges are merged and their weights added up
+    sources = cmap[level.sources]
+    targets = cmap[level.indices]
+    keep = sources != targets
+    keys, inverse = np.unique(sources[keep] * size + targets[keep], return_inverse=True)
+    edge_weights = np.bincount(inverse, weights=level.edge_weights[keep]).astype(np.int64)
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // size, minlength=size), out=indptr[1:])
+    node_weights = np.bincount(cmap, weights=level.node_weights, minlength=size).astype(np.int64)
+    level.cmap = cmap
+    return Level(indptr, keys % size, edge_weights, node_weights)
+
+
+def coarsen(level, rng, coarsest_size=100, min_reduction=0.05):
+    levels = [level]
+    while level.size > coarsest_size:
+        coarser = contract(level, heavy_edge_matching(level, rng))
+        if coarser.size > (1 - min_reduction) * level.size:
+            level.cmap = None
+            break
+        levels.append(coarser)
+        level = coarser
+    return levels
+
+
+def grow_bisection(level, rng):
+    # Breadth first region growing from a random node until half the weight
+    side = np.zeros(level.size, dtype=np.int8)
+    half = level.node_weights.sum() / 2
+    weight = 0
+    seen = np.zeros(level.size, dtype=bool)
+    for start in rng.permutation(level.size).tolist():
+        if weight >= half:
+            break
+        if seen[start]:
+            continue
+        seen[start] = True
+        frontier = deque([start])
+        while frontier and weight < half:
+            node = frontier.popleft()
+            side[node] = 1
+            weight += level.node_weights[node]
+            for neighbour in level.indices[level.indptr[node]:level.indptr[node + 1]].tolist():
+                if not seen[neighbour]:
+                    seen[neighbour] = True
+                    frontier.append(neighbour)
+    return side
+
+
+def refine(level, side, target, max_passes=10, cutoff=100):
+    # Boundary FM with weighted gains. A move may leave the blocks at most
+    # target + 2 * max node weight apart, but only prefixes whose imbalance
+    # is within target are kept when the pass is rolled back.
+    indptr = level.indptr.tolist()
+    indices = level.indices.tolist()
+    edge_weights = level.edge_weights.tolist()
+    node_weights = level.node_weights.tolist()
+    slack = target + 2 * max(node_weights)
+    block_weights = [int(level.node_weights[side == 0].sum()), int(level.node_weights[side == 1].sum())]
+    sides = side.tolist()
+
+    for _ in range(max_passes):
+        current = np.array(sides, dtype=np.int8)
+        gains = level.gains(current).tolist()
+        # Only boundary nodes start in the heaps, others join when they change
+        boundary = np.zeros(level.size, dtype=bool)
+        boundary[level.sources[current[level.sources] != current[level.indices]]] = True
+        heaps = [[], []]
+        for node in np.flatnonzero(boundary).tolist():
+            heaps[sides[node]].append((-gains[node], node))
+        heapq.heapify(heaps[0])
+        heapq.heapify(heaps[1])
+        locked = bytearray(level.size)
+
+        moves = []
+        pass_gain = best_gain = 0
+        imbalance = abs(block_weights[0] - block_weights[1])
+        best_prefix = 0 if imbalance <= target else -1
+        best_imbalance = imbalance
+        since_best = 0
+        while since_best < cutoff:
+            candidate = None
+            for source in (0, 1):
+                heap = heaps[source]
+                # Drop locked nodes and entries with an outdated gain
+                while heap and (locked[heap[0][1]] or -heap[0][0] != gains[heap[0][1]]
+                                or sides[heap[0][1]] != source):
+                    heapq.heappop(heap)
+                if not heap:
+                    continue
+                node = heap[0][1]
+                weight = node_weights[node]
+                after = abs(block_weights[source] - weight - block_weights[1 - source] - weight)
+                if after > slack and after >= imbalance:
+                    continue
+                if candidate is None or gains[node] > gains[candidate] or \
+                        (gains[node] == gains[candidate] and block_weights[source] > block_weights[1 - source]):
+                    candidate = node
+            if candidate is None:
+                break
+
+            node = candidate
+            source = sides[node]
+            heapq.heappop(heaps[source])
+            locked[node] = 1
+            pass_gain += gains[node]
+            block_weights[source] -= node_weights[node]
+            block_weights[1 - source] += node_weights[node]
+            sides[node] = 1 - source
+            moves.append(node)
+            for i in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[i]
+                if locked[neighbour]:
+                    continue
+                gains[neighbour] += 2 * edge_weights[i] if sides[neighbour] == source else -2 * edge_weights[i]
+                heapq.heappush(heaps[sides[neighbour]], (-gains[neighbour], neighbour))
+
+            imbalance = abs(block_weights[0] - block_weights[1])
+            since_best += 1
+            if imbalance <= target and (best_prefix < 0 or pass_gain > best_gain or
+                                        (pass_gain == best_gain and imbalance < best_imbalance)):
+                best_gain = pass_gain
+                best_prefix = len(moves)
+                best_imbalance = imbalance
+                since_best = 0
+
+        # Roll back to the best balanced prefix
+        for node in reversed(moves[max(best_prefix, 0):]):
+            block_weights[sides[node]] -= node_weights[node]
+            sides[node] = 1 - sides[node]
+            block_weights[sides[node]] += node_weights[node]
+        if best_gain <= 0:
+            break
+    side[:] = sides
+    return side
+
+
+def rebalance(level, side, target):
+    # Move the nodes with the highest gains out of the heavier block until
+    # the imbalance is within target
+    weights = [int(level.node_weights[side == 0].sum()), int(level.node_weights[side == 1].sum())]
+    heavy = 0 if weights[0] > weights[1] else 1
+    if weights[heavy] - weights[1 - heavy] <= target:
+        return side
+    gains = level.gains(side)
+    candidates = np.flatnonzero(side == heavy)
+    for node in candidates[np.argsort(-gains[candidates], kind='stable')].tolist():
+        weight = int(level.node_weights[node])
+        if abs(weights[heavy] - weights[1 - heavy] - 2 * weight) >= weights[heavy] - weights[1 - heavy]:
+            continue
+        side[node] = 1 - heavy
+        weights[heavy] -= weight
+        weights[1 - heavy] += weight
+        if weights[heavy] - weights[1 - heavy] <= target:
+            break
+    return side
+
+
+def multilevel_bisection(csr, seed=0, coarsest_size=100, initial_tries=8, epsilon=0.03,
+                         max_passes=10, cutoff=100, polish=False):
+    # Coarsen by heavy edge matching, bisect the coarsest level and refine
+    # with weighted FM while projecting back. The finest level is balanced
+    # exactly. With polish=True the result goes through Graph's FM once more.
+    rng = np.random.default_rng(seed)
+    levels = coarsen(Level.from_csr(csr), rng, coarsest_size)
+
+    coarsest = levels[-1]
+    target = epsilon * coarsest.node_weights.sum() + coarsest.node_weights.max()
+    best = None
+    for _ in range(initial_tries):
+        side = refine(coarsest, grow_bisection(coarsest, rng), target, max_passes, cutoff)
+        cut = coarsest.cutstate(side)
+        if best is None or cut < best[0]:
+            best = (cut, side)
+    side = best[1]
+
+    for level in reversed(levels[:-1]):
+        side = side[level.cmap]
+        if level is levels[0]:
+            target = level.node_weights.sum() % 2
+        else:
+            target = epsilon * level.node_weights.sum() + level.node_weights.max()
+        side = rebalance(level, side, target)
+        side = refine(level, side, target, max_passes, cutoff)
+    if len(levels) == 1:
+        side = refine(levels[0], rebalance(levels[0], side, csr.size % 2),
+                      csr.size % 2, max_passes, cutoff)
+
+    if polish:
+        graph = Graph(csr=csr)
+        graph.init_partition(side)
+        graph.setup_gains()
+        return graph.fiduccia_mattheyses()
+    return {'solution': Partition(side), 'cutstate': levels[0].cutstate(side)}
+
+
+if __name__ == '__main__':
+
+    csr = load_graph('Graph500.txt')
+    data_storage = join('data', 'multilevel')
+    makedirs(data_storage, exist_ok=True)
+    performance_stats = []
+    solutions = []
+    for j in range(25):
+        tic = perf_counter()
+        result = multilevel_bisection(csr, seed=j)
+        toc = perf_counter()
+        solution = result['solution'].to_solution(csr)
+        solution['cutstate'] = result['cutstate']
+        print(solution['cutstate'])
+        solutions.append(solution)
+        performance_stats.append({'Execution Time': toc - tic})
+    pd.DataFrame(solutions).to_csv(join(data_storage, f'multilevel_with_fm.csv'))
+    pd.DataFrame(performance_stats).to_csv(join(data_storage, f'multilevel_with_fm_performance.csv'))
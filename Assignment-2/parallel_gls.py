@@ -0,0 +1,131 @@
+import queue
+import random
+from multiprocessing import Pool
+from os import cpu_count
+from os.path import join
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+import parallel_mls
+from anytime import AnytimeTrace, save_traces
+from batch_fm import batch_local_search
+from ea import GLS
+from loader import load_graph
+from parallel_mls import init_worker, restart_seed
+from population import Population
+from shared_graph import SharedGraph
+
+
+def improve_individual(task):
+    # FM on one individual in a worker, returns (cutstate, Partition), or
+    # None when the budget is spent before or during the FM run
+    individual, seed = task
+    budget = parallel_mls.worker_budget
+    if budget is not None and budget.exhausted():
+        return None
+    random.seed(seed)
+    graph = parallel_mls.worker_graph
+    graph.reset_solutions()
+    graph.init_partition(individual)
+    graph.setup_gains()
+    result = graph.fiduccia_mattheyses(budget, parallel_mls.worker_cutoff)
+    if budget is not None and budget.exhausted():
+        return None
+    return result['cutstate'], result['solution']
+
+
+def steady_state_gls(csr, population_size=50, children=2450, seed=0, workers=None, in_flight=None,
+                     trace=None, budget=None, cutoff=None, batch_init=False):
+    # The master keeps the Population, makes children in batches of in_flight
+    # with GLS.crossover_batch() and sends them to a pool of FM workers. Finished children replace the
+    # worst individual through create_new_population in the order they come
+    # back. With in_flight=1 this is the sequential GLS.
+    # An AnytimeTrace given as trace records every FM result. Once budget is
+    # spent no more children are made, and individuals or children whose FM
+    # it stopped are left out, so the population can end up smaller.
+    # cutoff is the FM pass cutoff of the workers. With batch_init=True the
+    # initial population is improved by batch_local_search in the master
+    # instead of one FM run per individual.
+    random.seed(seed)
+    np.random.seed(seed)
+    workers = workers or cpu_count()
+    in_flight = in_flight or 2 * workers
+    gls = GLS(population_size=population_size, length=csr.size)
+    finished = queue.Queue()
+
+    with SharedGraph(csr) as shared, Pool(workers, init_worker, (shared.handle, budget, cutoff)) as pool:
+        # Improve population by running the FM on each individual once
+        population = Population(population_size, csr.size)
+        if batch_init:
+            sides, cutstates = batch_local_search(csr, np.stack(gls.population), seed=seed)
+            results = zip(cutstates.tolist(), sides)
+        else:
+            tasks = [(individual, restart_seed(seed, 0, i))
+                     for i, individual in enumerate(gls.population)]
+            results = pool.imap(improve_individual, tasks)
+        for result in results:
+            if result is None:
+                continue
+            cutstate, solution = result
+            if trace is not None:
+                trace.record(cutstate)
+            population.add(solution, cutstate)
+        gls.population = population
+
+        submitted = 0
+        batch = []
+
+        def submit_child():
+            nonlocal submitted, batch
+            if not batch:
+                batch = list(gls.crossover_batch(in_flight))
+            task = (batch.pop(), restart_seed(seed, 1, submitted))
+            pool.apply_async(improve_individual, (task,),
+                             callback=finished.put, error_callback=finished.put)
+            submitted += 1
+
+        def may_submit():
+            # Crossover needs two parents
+            return submitted < children and len(population) >= 2 and \
+                (budget is None or not budget.exhausted())
+
+        while submitted < in_flight and may_submit():
+            submit_child()
+        received = 0
+        while received < submitted:
+            result = finished.get()
+            received += 1
+            if isinstance(result, BaseException):
+                raise result
+            if result is not None:
+                child_cutstate, new_child = result
+                if trace is not None:
+                    trace.record(child_cutstate)
+                gls.create_new_population(new_child, child_cutstate)
+            if may_submit():
+                submit_child()
+    return gls, population
+
+
+if __name__ == '__main__':
+
+    csr = load_graph('Graph500.txt')
+    data_storage = join('data', 'gls')
+    performance_stats = []
+    solutions = []
+
+    traces = []
+    for j in range(25):
+        traces.append(AnytimeTrace())
+        tic = perf_counter()
+        gls, population = steady_state_gls(csr, population_size=50, children=2450, seed=j,
+                                                  trace=traces[-1])
+        toc = perf_counter()
+        solutions.append({'Cutstate': population.ranked_cutstates()})
+        performance_stats.append({'Execution Time': toc - tic})
+
+    pd.DataFrame(solutions).to_csv(join(data_storage, f'gls_with_fm_parallel.csv'))
+    save_traces(traces, join(data_storage, f'gls_with_fm_parallel_trace.npz'))
+    pd.DataFrame(performance_stats).to_csv(join(data_storage, f'gls_with_fm_parallel_performance.csv'))
@@ -0,0 +1,119 @@
+import random
+from multiprocessing import Pool
+from os.path import join
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from anytime import AnytimeTrace, save_traces
+from graph_correct import Graph
+from loader import load_graph
+from shared_graph import SharedGraph, attach_graph
+
+# Graph, Budget and FM pass cutoff of the current worker process, set by
+# init_worker
+worker_graph = None
+worker_budget = None
+worker_cutoff = None
+
+
+def restart_seed(seed, repetition, restart):
+    # Independent stream for every restart, whichever process runs it
+    return int(np.random.SeedSequence([seed, repetition, restart]).generate_state(1)[0])
+
+
+def run_restarts(graph, seed, repetition, first_restart, count, budget=None, cutoff=None):
+    # Best (cutstate, restart, solution) over a range of random restarts and
+    # the number of restarts run. The budget is the total of the whole run:
+    # once it is spent no restart starts, and a restart whose FM the budget
+    # stopped early is dropped, so best is None if no restart finished.
+    best = None
+    done = 0
+    for restart in range(first_restart, first_restart + count):
+        if budget is not None and budget.exhausted():
+            break
+        random.seed(restart_seed(seed, repetition, restart))
+        graph.reset_solutions()
+        graph.init_partition()
+        graph.setup_gains()
+        result = graph.fiduccia_mattheyses(budget, cutoff)
+        if budget is not None and budget.exhausted():
+            break
+        done += 1
+        if best is None or result['cutstate'] < best[0]:
+            best = (result['cutstate'], restart, result['solution'])
+    return repetition, best, done
+
+
+def init_worker(handle, budget=None, cutoff=None):
+    global worker_graph, worker_budget, worker_cutoff
+    worker_graph = Graph(csr=attach_graph(handle))
+    worker_budget = budget
+    worker_cutoff = cutoff
+
+
+def run_task(task):
+    return run_restarts(worker_graph, *task, worker_budget, worker_cutoff)
+
+
+def split_tasks(seed, repetitions, restarts, chunk_size):
+    return [(seed, repetition, first, min(chunk_size, restarts - first))
+            for repetition in range(repetitions)
+            for first in range(0, restarts, chunk_size)]
+
+
+def keep_best(results, repetitions, traces=None):
+    # Ties go to the lowest restart, so the reduction does not depend on the
+    # order in which the tasks finish. Repetitions without a finished restart
+    # are left out.
+    best = [None] * repetitions
+    for repetition, result, count in results:
+        if result is None:
+            continue
+        if best[repetition] is None or result[:2] < best[repetition][:2]:
+            best[repetition] = result
+        if traces is not None:
+            traces[repetition].record(result[0], count)
+    return [{'solution': result[2], 'cutstate': result[0], 'restart': result[1], 'repetition': repetition}
+            for repetition, result in enumerate(best) if result is not None]
+
+
+def multi_start_local_search(csr, repetitions=25, restarts=2500, seed=0, workers=None, chunk_size=50,
+                             traces=None, budget=None, cutoff=None):
+    # Runs the restarts of every repetition over a process pool and returns
+    # the best solution per repetition, the same as a sequential run
+    # (workers=1) with the same seed. traces, one AnytimeTrace per
+    # repetition, record the best cutstate as chunks of restarts finish.
+    # With a Budget, a total for all repetitions, the remaining restarts are
+    # skipped once it is spent and only restarts that finished count, so
+    # fewer than repetitions results may come back. Its deadline is shared by
+    # the workers and its counters are per worker.
+    # cutoff is passed on to every fiduccia_mattheyses call.
+    tasks = split_tasks(seed, repetitions, restarts, chunk_size)
+    if workers == 1:
+        graph = Graph(csr=csr)
+        return keep_best((run_restarts(graph, *task, budget, cutoff) for task in tasks), repetitions, traces)
+    with SharedGraph(csr) as shared, Pool(workers, init_worker, (shared.handle, budget, cutoff)) as pool:
+        return keep_best(pool.imap_unordered(run_task, tasks), repetitions, traces)
+
+
+if __name__ == '__main__':
+
+    csr = load_graph('Graph500.txt')
+    data_storage = join('data', 'mls')
+    traces = [AnytimeTrace() for _ in range(25)]
+    tic = perf_counter()
+    results = multi_start_local_search(csr, repetitions=25, restarts=2500, seed=0, traces=traces)
+    toc = perf_counter()
+    save_traces(traces, join(data_storage, f'mls_with_fm_parallel_trace.npz'))
+
+    solutions = []
+    for result in results:
+        solution = result['solution'].to_solution(csr)
+        solution['cutstate'] = result['cutstate']
+        print(solution['cutstate'])
+        solutions.append(solution)
+    pd.DataFrame(solutions).to_csv(join(data_storage, f'mls_with_fm_parallel.csv'))
+    pd.DataFrame([{'Execution Time': toc - tic}]).to_csv(
+        join(data_storage, f'mls_with_fm_parallel_performance.csv'))
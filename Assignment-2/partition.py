@@ -0,0 +1,81 @@
+from array import array
+
+import numpy as np
+
+
+class PartitionState:
+    # Per node state of a bipartition, indexed by node id. Every entry takes
+    # a few bytes instead of the dict/list entries used by the blocks before.
+    __slots__ = ('side', 'locked', 'gain', 'position')
+
+    def __init__(self, size):
+        # Block of the node: 1 for block a, 0 for block b
+        self.side = array('b', bytes(size))
+        # 1 when the node has been moved during the current pass
+        self.locked = array('b', bytes(size))
+        # Gain of moving the node to the other block
+        self.gain = array('i', bytes(4 * size))
+        # Index of the node inside its gain bucket, -1 when it is not stored
+        self.position = array('i', [-1]) * size
+
+    @property
+    def size(self):
+        return len(self.side)
+
+    def free_all_nodes(self):
+        np.frombuffer(self.locked, dtype=np.int8)[:] = 0
+
+    def reset(self):
+        # Every node free and out of the buckets, the sides are set next
+        self.free_all_nodes()
+        np.frombuffer(self.position, dtype=np.int32)[:] = -1
+
+
+class Partition(np.ndarray):
+    # Sides of the nodes (1 for block a, 0 for block b) by node index, as an
+    # int8 array. Any int8 array, like a row of the Population matrix, is
+    # taken as a view without copying. A partition and its complement are
+    # the same bipartition, canonical() picks the one with node 0 in block b.
+    def __new__(cls, sides):
+        return np.asarray(sides, dtype=np.int8).view(cls)
+
+    @classmethod
+    def random(cls, size):
+        # Balanced random partition, the first size // 2 of a permutation in a
+        partition = np.zeros(size, dtype=np.int8)
+        partition[np.random.permutation(size)[:size // 2]] = 1
+        return partition.view(cls)
+
+    @classmethod
+    def from_solution(cls, solution, csr):
+        # Solution dict keyed by the node ids of the input file
+        partition = np.zeros(csr.size, dtype=np.int8)
+        nodes = csr.to_index(np.fromiter(solution.keys(), dtype=np.int32, count=len(solution)))
+        partition[nodes] = np.fromiter(solution.values(), dtype=np.int8, count=len(solution))
+        return partition.view(cls)
+
+    def to_solution(self, csr):
+        return dict(zip(csr.labels.tolist(), self.tolist()))
+
+    @property
+    def ones(self):
+        return int(np.count_nonzero(self))
+
+    def canonical(self):
+        return 1 - self if len(self) and self[0] else self
+
+    def packed(self):
+        return np.packbits(self.view(np.ndarray))
+
+    def key(self):
+        # Hashable and equal for a partition and its complement
+        return self.canonical().packed().tobytes()
+
+    def distance(self, other):
+        # Hamming distance
+        return int(np.count_nonzero(self.view(np.ndarray) != other))
+
+    def aligned_distance(self, other):
+        # Hamming distance to other or to its complement, whichever is closer
+        distance = self.distance(other)
+        return min(distance, len(self) - distance)
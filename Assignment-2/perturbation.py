@@ -0,0 +1,44 @@
+import numpy as np
+
+
+def sample_block(side, value, count, rounds=8):
+    # count distinct random nodes with side[node] == value. Random draws are
+    # kept when they hit the block, which takes O(count) work for small
+    # counts. Large counts or small blocks list the block instead.
+    if 16 * count <= len(side):
+        chosen = np.zeros(0, dtype=np.int64)
+        for _ in range(rounds):
+            draws = np.random.randint(0, len(side), 2 * (count - len(chosen)) + 8)
+            chosen = np.concatenate([chosen, draws[side[draws] == value]])
+            # Drop repeated nodes without changing the random order
+            _, first = np.unique(chosen, return_index=True)
+            chosen = chosen[np.sort(first)]
+            if len(chosen) >= count:
+                return chosen[:count]
+    nodes = np.flatnonzero(side == value)
+    return np.random.choice(nodes, min(count, len(nodes)), replace=False)
+
+
+def balanced_perturbation(side, count, out=None):
+    # Moves count random nodes of each block to the other block, so the block
+    # sizes do not change. side is a Partition and is left alone unless it is
+    # also given as out.
+    if out is None:
+        out = side.copy()
+    elif out is not side:
+        np.copyto(out, side)
+    ones = sample_block(side, 1, count)
+    zeros = sample_block(side, 0, len(ones))
+    ones = ones[:len(zeros)]
+    out[ones] = 0
+    out[zeros] = 1
+    return out
+
+
+def mutation(side, perturbation=0.01, out=None):
+    # About perturbation * n nodes change block, as when every node was
+    # flipped with that probability, and the balance is kept. Halves round
+    # up, so every rate rounds the same way.
+    count = max(1, int(perturbation * len(side) / 2 + 0.5))
+    return balanced_perturbation(side, count, out)
+
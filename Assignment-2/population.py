@@ -0,0 +1,65 @@
+import heapq
+import random
+
+import numpy as np
+
+from partition import Partition
+
+
+# Cutstate of individuals no FM has run on yet, worse than any real one
+UNEVALUATED = np.iinfo(np.int64).max
+
+
+class Population:
+    # Individuals of the GLS as the rows of one int8 matrix. A heap of
+    # (-cutstate, tie key, slot) entries has the worst individual on top, the
+    # slot being its row in the matrix, so replacing it takes O(log P).
+    # Individuals with the same cutstate get random tie keys, which picks one
+    # of the worst at random as create_new_population did.
+    def __init__(self, capacity, length):
+        self.matrix = np.zeros((capacity, length), dtype=np.int8)
+        self.cutstates = np.zeros(capacity, dtype=np.int64)
+        self.heap = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, slot):
+        return self.matrix[slot].view(Partition)
+
+    def __iter__(self):
+        for slot in range(self.size):
+            yield self[slot]
+
+    def add(self, individual, cutstate):
+        # Fills the next free slot, used while the population is built
+        slot = self.size
+        self.matrix[slot] = individual
+        self.cutstates[slot] = cutstate
+        heapq.heappush(self.heap, (-cutstate, random.random(), slot))
+        self.size += 1
+        return slot
+
+    def worst(self):
+        # (cutstate, slot) of the worst individual
+        cutstate, _, slot = self.heap[0]
+        return -cutstate, slot
+
+    def replace_worst(self, individual, cutstate):
+        # The individual takes the slot of the worst one if it is not worse
+        worst_cutstate, slot = self.worst()
+        if cutstate > worst_cutstate:
+            return None
+        self.matrix[slot] = individual
+        self.cutstates[slot] = cutstate
+        heapq.heapreplace(self.heap, (-cutstate, random.random(), slot))
+        return slot
+
+    def best(self):
+        slot = int(np.argmin(self.cutstates[:self.size]))
+        return int(self.cutstates[slot]), self[slot]
+
+    def ranked_cutstates(self):
+        # Distinct cutstates from best to worst
+        return np.unique(self.cutstates[:self.size]).tolist()
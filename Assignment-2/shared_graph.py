@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+import numpy as np
+
+from csr import CSRGraph
+
+
+def shared_directory():
+    # Files in /dev/shm live in memory, elsewhere they stay in the page cache
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+
+class SharedGraph:
+    # Publishes the arrays of a CSRGraph once in a memory mapped file. Worker
+    # processes receive the small picklable handle and map the same pages
+    # read only, so adding workers does not copy the graph.
+    def __init__(self, csr):
+        arrays = [('indptr', csr.indptr), ('indices', csr.indices),
+                  ('degrees', csr.degrees), ('labels', csr.labels)]
+        arrays += [(f'edge_ends_{i}', ends) for i, ends in enumerate(csr.edges())]
+        if csr.coordinates is not None:
+            arrays.append(('coordinates', csr.coordinates))
+
+        arrays = [(name, np.ascontiguousarray(array)) for name, array in arrays]
+        layout = []
+        offset = 0
+        for name, array in arrays:
+            layout.append((name, array.dtype.str, array.shape, offset))
+            # Keep every array aligned to 64 bytes
+            offset += -(-array.nbytes // 64) * 64
+
+        descriptor, self.path = tempfile.mkstemp(prefix='graph-', suffix='.bin', dir=shared_directory())
+        os.close(descriptor)
+        mapping = np.memmap(self.path, dtype=np.uint8, mode='w+', shape=(max(offset, 1),))
+        for (_, array), (_, _, _, start) in zip(arrays, layout):
+            mapping[start:start + array.nbytes] = array.view(np.uint8).reshape(-1)
+        mapping.flush()
+        del mapping
+        self.handle = {'path': self.path, 'layout': layout}
+
+    def attach(self):
+        return attach_graph(self.handle)
+
+    def close(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_graph(handle):
+    # Read only CSRGraph whose arrays are views of the shared mapping
+    mapping = np.memmap(handle['path'], dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, dtype, shape, start in handle['layout']:
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(mapping, dtype=np.dtype(dtype), count=count,
+                                     offset=start).reshape(shape)
+    csr = CSRGraph(arrays['indptr'], arrays['indices'], arrays['labels'],
+                   arrays.get('coordinates'), arrays['degrees'])
+    csr.edge_ends = (arrays['edge_ends_0'], arrays['edge_ends_1'])
+    return csr